@@ -0,0 +1,131 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from DataFunctions import monthly_table
+
+MIN_HISTORY = 3
+SEASON = 12
+
+# Scores are on log year-over-year ratios, so the MAD floor is a relative
+# change: month-to-month noise below about 5% never counts as an anomaly.
+MIN_MAD = 0.05
+
+ANOMALY_COLUMNS = ['meter', 'month', 'metric', 'value', 'expected', 'score', 'reason']
+
+
+def _trailing_median_mad(values, window):
+    padded = np.vstack([np.full((window, values.shape[1]), np.nan), values])
+    windows = sliding_window_view(padded[:-1], window, axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        median = np.nanmedian(windows, axis=-1)
+        mad = np.nanmedian(np.abs(windows - median[..., None]), axis=-1)
+    counts = (~np.isnan(windows)).sum(axis=-1)
+    return median, mad, counts
+
+
+def seasonal_zscores(values, window):
+    # Each month is compared with the same month last year. The log ratio
+    # removes solar seasonality, and it is then scored against the median and
+    # MAD of the preceding window ratios of the same meter, all meters at once.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logs = np.where(values > 0, np.log(values), np.nan)
+    ratios = np.full_like(logs, np.nan)
+    ratios[SEASON:] = logs[SEASON:] - logs[:-SEASON]
+
+    median, mad, counts = _trailing_median_mad(ratios, window)
+    mad = np.maximum(mad, MIN_MAD)
+    zscores = 0.6745 * (ratios - median) / mad
+    zscores[counts < MIN_HISTORY] = np.nan
+
+    expected = np.full_like(values, np.nan)
+    expected[SEASON:] = values[:-SEASON] * np.exp(median[SEASON:])
+    return expected, zscores
+
+
+# Metrics scored against their own seasonal history, and the direction that
+# counts as an anomaly. The discount is checked against the contract instead.
+SCORED_METRICS = {
+    'off_peak': (lambda z, threshold: z < -threshold, 'Sudden drop in off-peak kWh'),
+    'net_electric_cost': (lambda z, threshold: np.abs(z) > threshold, 'Net cost out of band'),
+}
+
+
+def _changed_months(old, new):
+    # Months per meter whose value was added, removed or changed since the
+    # previous run; NaN on both sides is not a change.
+    months = old.index.union(new.index)
+    meters = old.columns.union(new.columns)
+    before = old.reindex(index=months, columns=meters).to_numpy(dtype=float)
+    after = new.reindex(index=months, columns=meters).to_numpy(dtype=float)
+    differs = (before != after) & ~(np.isnan(before) & np.isnan(after))
+    return {meter: months[differs[:, i]] for i, meter in enumerate(meters) if differs[:, i].any()}
+
+
+def _affected_months(changed, reach):
+    # A month's score reads the value a season back and the ratios of the
+    # preceding window, so a change at month m moves the scores of m..m+reach.
+    ordinals = np.unique((changed.asi8[:, None] + np.arange(reach + 1)[None, :]).ravel())
+    return pd.PeriodIndex.from_ordinals(ordinals, freq='M')
+
+
+def _rescore(flags, new, metric, meter, months, window, threshold):
+    condition, reason = SCORED_METRICS[metric]
+    span = pd.period_range(months[0] - window - SEASON, months[-1], freq='M')
+    values = new[meter].reindex(span).to_numpy(dtype=float)[:, None]
+    expected, scores = seasonal_zscores(values, window)
+    positions = span.get_indexer(months)
+    with np.errstate(invalid='ignore'):
+        hits = condition(scores[positions, 0], threshold)
+    for month, position, hit in zip(months, positions, hits):
+        if hit:
+            flags[(meter, str(month), metric)] = (
+                meter, str(month), metric, values[position, 0], expected[position, 0], scores[position, 0], reason,
+            )
+
+
+def update_anomalies(state, records_frame, contract_discount, window=6, threshold=3.5, tolerance=0.5):
+    # state keeps the monthly tables and flags of the previous run, keyed by
+    # (meter, month, metric), so that only the months whose trailing or
+    # seasonal window changed are scored again when new bills arrive.
+    settings = (contract_discount, window, threshold, tolerance)
+    if state.get('settings') != settings:
+        state.clear()
+        state.update(settings=settings, tables={}, flags={})
+    flags = state['flags']
+    empty = pd.DataFrame(index=pd.PeriodIndex([], freq='M'))
+
+    for metric in SCORED_METRICS:
+        new = monthly_table(records_frame, metric)
+        old = state['tables'].get(metric, empty)
+        for meter, changed in _changed_months(old, new).items():
+            affected = _affected_months(changed, window + SEASON)
+            for month in affected.astype(str):
+                flags.pop((meter, month, metric), None)
+            months = new.index[new.index.isin(affected)] if meter in new.columns else new.index[:0]
+            if len(months):
+                _rescore(flags, new, metric, meter, months, window, threshold)
+        state['tables'][metric] = new
+
+    new = monthly_table(records_frame, 'discount_percent', 'mean')
+    old = state['tables'].get('discount_percent', empty)
+    for meter, months in _changed_months(old, new).items():
+        for month in months:
+            key = (meter, str(month), 'discount_percent')
+            flags.pop(key, None)
+            value = new.at[month, meter] if meter in new.columns and month in new.index else np.nan
+            if abs(value - contract_discount) > tolerance:
+                flags[key] = (
+                    meter, str(month), 'discount_percent', value, contract_discount,
+                    value - contract_discount, 'Discount differs from contract',
+                )
+    state['tables']['discount_percent'] = new
+
+    return pd.DataFrame(list(flags.values()), columns=ANOMALY_COLUMNS)
+
+
+def detect_anomalies(records_frame, contract_discount, window=6, threshold=3.5, tolerance=0.5):
+    return update_anomalies({}, records_frame, contract_discount, window, threshold, tolerance)
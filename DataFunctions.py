@@ -0,0 +1,168 @@
+import hashlib
+import re
+
+import pandas as pd
+
+from LayoutFunctions import resolve_layout
+from LayoutFunctions import read_cell
+
+METRICS = ['peak', 'off_peak', 'power', 'peak_baht', 'off_peak_baht', 'electric_cost', 'discount', 'net_electric_cost']
+
+GRANULARITIES = ['Month', 'Quarter', 'Year', 'Contract Period']
+
+
+def check_type(value, expected_type):
+    if not isinstance(value, expected_type):
+        raise ValueError(f"Expected {expected_type}, but got {type(value)}")
+
+
+def convert_to_number(value):
+    try:
+        return float(value.replace(',', ''))
+    except (ValueError, AttributeError):
+        return value
+
+
+def deduplicate_uploads(files):
+    unique_files = []
+    duplicates = []
+    seen = {}
+    for file in files:
+        digest = hashlib.sha256(file.getvalue()).hexdigest()
+        if digest in seen:
+            duplicates.append((file.name, seen[digest]))
+            continue
+        seen[digest] = file.name
+        unique_files.append(file)
+    return unique_files, duplicates
+
+
+def read_number(df, layout, field):
+    value = convert_to_number(read_cell(df, layout, field))
+    check_type(value, (int, float))
+    return value
+
+
+def read_optional_number(df, layout, field):
+    try:
+        return read_number(df, layout, field)
+    except (KeyError, IndexError, ValueError):
+        return float('nan')
+
+
+def extract_sheet_record(df, layout):
+    # Peak power and the discount percentage are only charted, so a missing
+    # value there keeps the sheet in the totals instead of dropping it.
+    peak = read_number(df, layout, 'peak_kwh')
+    off_peak = read_number(df, layout, 'off_peak_kwh')
+    electric_cost = read_number(df, layout, 'electric_cost')
+    discount = read_number(df, layout, 'discount')
+    return {
+        'peak': peak,
+        'off_peak': off_peak,
+        'power': peak + off_peak,
+        'peak_baht': read_number(df, layout, 'peak_baht'),
+        'off_peak_baht': read_number(df, layout, 'off_peak_baht'),
+        'peak_power': read_optional_number(df, layout, 'peak_power'),
+        'electric_cost': electric_cost,
+        'discount': discount,
+        'net_electric_cost': electric_cost - discount,
+        'discount_percent': read_optional_number(df, layout, 'discount_percent') * 100,
+    }
+
+
+def meter_name(sheet_name):
+    match = re.search(r'Meter\s?\d+', sheet_name)
+    return match.group(0) if match else None
+
+
+def sheet_date(df):
+    # The billing date is in A1, which read_excel has already taken as the
+    # first column header, so the sheet does not need to be read again.
+    match = re.search(r"\d{4}-\d{2}-\d{2}", str(df.columns[0]))
+    return pd.to_datetime(match.group(0)).strftime('%Y-%m-%d') if match else None
+
+
+def read_bill(file):
+    return pd.read_excel(file, sheet_name=None)
+
+
+def extract_meter_records(sheets, file_name):
+    records = []
+    errors = []
+    templates = {}
+    for sheet_name, df in sheets.items():
+        meter = meter_name(sheet_name)
+        if not meter:
+            continue
+        layout = resolve_layout(df)
+        templates[layout['fingerprint']] = {'moved': layout['moved'], 'unresolved': layout['unresolved']}
+        try:
+            record = extract_sheet_record(df, layout)
+        except (KeyError, IndexError, ValueError) as e:
+            errors.append((file_name, sheet_name, str(e)))
+            continue
+        record.update({'file': file_name, 'sheet': sheet_name, 'date': sheet_date(df), 'meter': meter, 'template': layout['fingerprint']})
+        records.append(record)
+    return records, errors, templates
+
+
+def monthly_table(records_frame, column, aggfunc='sum'):
+    # Month x meter table covering every month from the first bill to the
+    # last; undated bills are left out, and no values give an empty table.
+    frame = records_frame.dropna(subset=['date'])
+    frame = frame.assign(month=pd.to_datetime(frame['date']).dt.to_period('M'))
+    table = frame.pivot_table(index='month', columns='meter', values=column, aggfunc=aggfunc)
+    if table.empty:
+        return pd.DataFrame(index=pd.PeriodIndex([], freq='M'))
+    months = pd.period_range(table.index.min(), table.index.max(), freq='M')
+    return table.reindex(months)
+
+
+def _period_keys(months, granularity, contract_start):
+    if granularity == 'Month':
+        return months.astype(str)
+    if granularity == 'Quarter':
+        return months.dt.asfreq('Q').astype(str)
+    if granularity == 'Year':
+        return months.dt.year.astype(str)
+    elapsed = (months.dt.year - contract_start.year) * 12 + (months.dt.month - contract_start.month)
+    labels = "Contract Year " + (elapsed // 12 + 1).astype(str).str.zfill(2)
+    return labels.where(elapsed >= 0, "Before Contract")
+
+
+def build_rollup_cube(records, contract_start=None):
+    frame = pd.DataFrame(records)
+    if frame.empty:
+        return {}
+
+    frame = frame.assign(month=pd.to_datetime(frame['date']).dt.to_period('M'))
+    monthly = frame.groupby(['meter', 'month'])[METRICS].sum().reset_index()
+    if contract_start is None:
+        contract_start = monthly['month'].min()
+    else:
+        contract_start = pd.Period(contract_start, freq='M')
+
+    cube = {}
+    for granularity in GRANULARITIES:
+        monthly['period'] = _period_keys(monthly['month'], granularity, contract_start)
+        by_meter = monthly.groupby(['meter', 'period'])[METRICS].sum()
+        all_meters = monthly.groupby('period')[METRICS].sum()
+        all_meters.index = pd.MultiIndex.from_product([['All Meters'], all_meters.index], names=['meter', 'period'])
+        cube[granularity] = pd.concat([by_meter, all_meters])
+    return cube
+
+
+def rollup_value(cube, granularity, meter, period, metric):
+    try:
+        return cube[granularity].at[(meter, period), metric]
+    except KeyError:
+        return 0.0
+
+
+def rollup_periods(cube, granularity):
+    return sorted(cube[granularity].index.get_level_values('period').unique())
+
+
+def rollup_meters(cube, granularity):
+    return list(cube[granularity].index.get_level_values('meter').unique())
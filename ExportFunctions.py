@@ -0,0 +1,89 @@
+import io
+import tempfile
+
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+}
+
+CHUNK_ROWS = 50000
+
+
+def iter_chunks(frame, chunk_size=CHUNK_ROWS):
+    for start in range(0, len(frame), chunk_size):
+        yield frame.iloc[start:start + chunk_size]
+
+
+def _write_csv(frame, target):
+    for i, chunk in enumerate(iter_chunks(frame)):
+        target.write(chunk.to_csv(header=(i == 0), index=False).encode('utf-8'))
+
+
+def _write_parquet(frame, target):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # The schema is inferred from the full frame: an empty slice has no
+    # values, so its object columns would come out as the Arrow null type.
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(target, schema) as writer:
+        for chunk in iter_chunks(frame):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def _write_excel(tables, target):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    workbook = Workbook(write_only=True)
+    for sheet_name, frame in tables.items():
+        sheet = workbook.create_sheet(sheet_name)
+        for i, column in enumerate(frame.columns):
+            sheet.column_dimensions[get_column_letter(i + 1)].width = max(len(str(column)) + 4, 14)
+
+        header = []
+        for column in frame.columns:
+            cell = WriteOnlyCell(sheet, value=str(column))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+
+        for chunk in iter_chunks(frame):
+            for row in chunk.itertuples(index=False):
+                cells = []
+                for value in row:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    if isinstance(value, float):
+                        cell.number_format = '#,##0.00'
+                    cells.append(cell)
+                sheet.append(cells)
+    workbook.save(target)
+
+
+def _export(writer, data):
+    # Rows are written chunk by chunk into a temporary file rather than
+    # collected in memory, and the file is handed back open and rewound so
+    # the caller streams it instead of keeping a copy of its bytes.
+    target = tempfile.TemporaryFile()
+    try:
+        writer(data, target)
+        target.seek(0)
+    except BaseException:
+        target.close()
+        raise
+    return io.BufferedReader(target.detach())
+
+
+def export_table(frame, export_format):
+    if export_format == 'Parquet':
+        return _export(_write_parquet, frame)
+    if export_format == 'Excel':
+        return _export(_write_excel, {'Data': frame})
+    return _export(_write_csv, frame)
+
+
+def export_workbook(tables):
+    return _export(_write_excel, tables)
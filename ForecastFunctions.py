@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+from DataFunctions import monthly_table
+
+# Intercept, yearly trend and one yearly harmonic; seasonality and trend are
+# shrunk away for meters whose history is too short to support them.
+MIN_MONTHS_TREND = 3
+MIN_MONTHS_SEASONAL = 12
+SHRINK = 1e6
+
+SUMMARY_COLUMNS = [
+    'meter', 'total', 'guarantee', 'expected_at_end', 'lower_at_end', 'upper_at_end',
+    'shortfall', 'shortfall_high', 'shortfall_low', 'expected_date', 'earliest_date', 'latest_date', 'reached',
+]
+
+
+def _design(steps):
+    phase = 2 * np.pi * steps / 12
+    return np.column_stack([np.ones_like(steps), steps / 12, np.sin(phase), np.cos(phase)])
+
+
+def fit_seasonal_models(values):
+    # values is (months, meters) with NaN for missing months; every meter is
+    # fitted at once through batched weighted normal equations.
+    steps = np.arange(values.shape[0], dtype=float)
+    design = _design(steps)
+    weights = (~np.isnan(values)).astype(float).T
+    targets = np.nan_to_num(values).T
+    counts = weights.sum(axis=1)
+
+    penalty = np.zeros((len(counts), design.shape[1]))
+    penalty[:, 1] = np.where(counts < MIN_MONTHS_TREND, SHRINK, 1e-9)
+    penalty[:, 2:] = np.where(counts < MIN_MONTHS_SEASONAL, SHRINK, 1e-9)[:, None]
+
+    normal = np.einsum('tk,mt,tj->mkj', design, weights, design) + penalty[:, :, None] * np.eye(design.shape[1])
+    rhs = np.einsum('tk,mt,mt->mk', design, weights, targets)
+    coefficients = np.linalg.solve(normal, rhs[:, :, None])[:, :, 0]
+
+    residuals = (targets - coefficients @ design.T) * weights
+    dof = np.maximum(counts - np.minimum(counts - 1, design.shape[1]), 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / dof)
+    return coefficients, sigma
+
+
+def _first_reached(cumulative, guarantees, future_months):
+    if cumulative.shape[1] == 0:
+        return [None] * len(guarantees)
+    reached = cumulative >= guarantees[:, None]
+    index = reached.argmax(axis=1)
+    return [str(future_months[i]) if hit else None for i, hit in zip(index, reached.any(axis=1))]
+
+
+def forecast_attainment(records_frame, guarantees, contract_end, z=1.96):
+    # Undated bills cannot be placed on the monthly trend, but their energy
+    # has been delivered, so it still counts towards each meter's total.
+    table = monthly_table(records_frame, 'power')
+    if table.empty:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS), None
+    months, meters, values = table.index, list(table.columns), table.to_numpy(dtype=float)
+    undated = records_frame[records_frame['date'].isna()].groupby('meter')['power'].sum().reindex(meters, fill_value=0.0).to_numpy(dtype=float)
+    coefficients, sigma = fit_seasonal_models(values)
+
+    end = pd.Period(contract_end, freq='M')
+    horizon = max((end.year - months[-1].year) * 12 + end.month - months[-1].month, 0)
+    future_months = pd.period_range(months[-1] + 1, periods=horizon, freq='M')
+    future_steps = np.arange(len(months), len(months) + horizon, dtype=float)
+
+    production = np.clip(coefficients @ _design(future_steps).T, 0, None)
+    totals = np.nansum(values, axis=0) + undated
+    cumulative = totals[:, None] + np.cumsum(production, axis=1)
+    spread = z * sigma[:, None] * np.sqrt(np.arange(1, horizon + 1))[None, :]
+    lower = cumulative - spread
+    upper = cumulative + spread
+
+    targets = np.array([guarantees.get(meter, 0.0) for meter in meters], dtype=float)
+    expected_end = cumulative[:, -1] if horizon else totals
+    lower_end = lower[:, -1] if horizon else totals
+    upper_end = upper[:, -1] if horizon else totals
+
+    summary = pd.DataFrame({
+        'meter': meters,
+        'total': totals,
+        'guarantee': targets,
+        'expected_at_end': expected_end,
+        'lower_at_end': lower_end,
+        'upper_at_end': upper_end,
+        'shortfall': np.clip(targets - expected_end, 0, None),
+        'shortfall_high': np.clip(targets - lower_end, 0, None),
+        'shortfall_low': np.clip(targets - upper_end, 0, None),
+        'expected_date': _first_reached(cumulative, targets, future_months),
+        'earliest_date': _first_reached(upper, targets, future_months),
+        'latest_date': _first_reached(lower, targets, future_months),
+        'reached': totals >= targets,
+    })
+
+    projection = {
+        'months': months,
+        'history': np.nancumsum(values, axis=0).T + undated[:, None],
+        'future_months': future_months,
+        'cumulative': cumulative,
+        'lower': lower,
+        'upper': upper,
+    }
+    return summary, projection
@@ -1,5 +1,21 @@
 import plotly.graph_objects as go
 
+def _split_by_meter(x_values, y_values, dates, meters):
+    if meters is None:
+        return [(None, list(x_values), list(y_values), list(dates))]
+    traces = {}
+    for x, y, date, meter in zip(x_values, y_values, dates, meters):
+        trace = traces.setdefault(meter, ([], [], []))
+        trace[0].append(x)
+        trace[1].append(y)
+        trace[2].append(date)
+    return [(meter, x, y, trace_dates) for meter, (x, y, trace_dates) in traces.items()]
+
+def _trace_name(meter_name, label):
+    if meter_name is None:
+        return label
+    return f"{meter_name} {label}"
+
 def create_fig_pie(peak, off_peak, file_name, file_date):
     fig_pie = go.Figure(data=[go.Pie(
         labels=['Peak Power', 'Off-Peak Power'],
@@ -37,18 +53,18 @@ def plot_power_distribution(total_peak, total_off_peak):
     )
     return fig_pie
 
-import plotly.graph_objects as go
-
-def plot_peak_values(file_names, peak_values, dates):
+def plot_peak_values(file_names, peak_values, dates, meters=None):
     fig_peak = go.Figure()
-    fig_peak.add_trace(go.Scatter(
-        x=file_names,
-        y=peak_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(peak_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, peak_values, dates, meters):
+        fig_peak.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_peak.update_layout(
         title="Peak Values Over Time",
@@ -59,16 +75,18 @@ def plot_peak_values(file_names, peak_values, dates):
 
     return fig_peak
 
-def plot_peak_values_baht(file_names, peak_baht_values, dates):
+def plot_peak_values_baht(file_names, peak_baht_values, dates, meters=None):
     fig_peak_baht = go.Figure()
-    fig_peak_baht.add_trace(go.Scatter(
-        x=file_names,
-        y=peak_baht_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} Baht<br>Date: {date}' for val, date in zip(peak_baht_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, peak_baht_values, dates, meters):
+        fig_peak_baht.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} Baht<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_peak_baht.update_layout(
         title="Peak Values in Baht Over Time",
@@ -79,16 +97,18 @@ def plot_peak_values_baht(file_names, peak_baht_values, dates):
 
     return fig_peak_baht
 
-def plot_off_peak_values(file_names, off_peak_values, dates):
+def plot_off_peak_values(file_names, off_peak_values, dates, meters=None):
     fig_off_peak = go.Figure()
-    fig_off_peak.add_trace(go.Scatter(
-        x=file_names,
-        y=off_peak_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(off_peak_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, off_peak_values, dates, meters):
+        fig_off_peak.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_off_peak.update_layout(
         title="Off-Peak Values Over Time",
@@ -99,16 +119,18 @@ def plot_off_peak_values(file_names, off_peak_values, dates):
 
     return fig_off_peak
 
-def plot_off_peak_values_baht(file_names, off_peak_baht_values, dates):
+def plot_off_peak_values_baht(file_names, off_peak_baht_values, dates, meters=None):
     fig_off_peak_baht = go.Figure()
-    fig_off_peak_baht.add_trace(go.Scatter(
-        x=file_names,
-        y=off_peak_baht_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} Baht<br>Date: {date}' for val, date in zip(off_peak_baht_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, off_peak_baht_values, dates, meters):
+        fig_off_peak_baht.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} Baht<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_off_peak_baht.update_layout(
         title="Off-Peak Values in Baht Over Time",
@@ -119,16 +141,18 @@ def plot_off_peak_values_baht(file_names, off_peak_baht_values, dates):
 
     return fig_off_peak_baht
 
-def plot_power_values(file_names, power_values, dates):
+def plot_power_values(file_names, power_values, dates, meters=None):
     fig_power = go.Figure()
-    fig_power.add_trace(go.Scatter(
-        x=file_names,
-        y=power_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(power_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, power_values, dates, meters):
+        fig_power.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_power.update_layout(
         title="Power Values Over Time",
@@ -139,38 +163,27 @@ def plot_power_values(file_names, power_values, dates):
 
     return fig_power
 
-def plot_combined_power_values(file_names, power_values, peak_values, off_peak_values, dates):
+def plot_combined_power_values(file_names, power_values, peak_values, off_peak_values, dates, meters=None):
     fig_combined = go.Figure()
 
-    fig_combined.add_trace(go.Bar(
-        x=file_names,
-        y=power_values,
-        name='Total Power',
-        marker=dict(color='rgba(55, 83, 109, 0.7)'),
-        text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(power_values, dates)],
-        hoverinfo='text',
-        textposition='none'
-    ))
-
-    fig_combined.add_trace(go.Bar(
-        x=file_names,
-        y=peak_values,
-        name='Peak Power',
-        marker=dict(color='rgba(26, 118, 255, 0.7)'),
-        text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(peak_values, dates)],
-        hoverinfo='text',
-        textposition='none'  
-    ))
-    
-    fig_combined.add_trace(go.Bar(
-        x=file_names,
-        y=off_peak_values,
-        name='Off-Peak Power',
-        marker=dict(color='rgba(50, 171, 96, 0.7)'),
-        text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(off_peak_values, dates)],
-        hoverinfo='text',
-        textposition='none' 
-    ))
+    series = [
+        ('Total Power', power_values, 'rgba(55, 83, 109, 0.7)'),
+        ('Peak Power', peak_values, 'rgba(26, 118, 255, 0.7)'),
+        ('Off-Peak Power', off_peak_values, 'rgba(50, 171, 96, 0.7)'),
+    ]
+
+    for label, values, color in series:
+        for meter_name, x, y, trace_dates in _split_by_meter(file_names, values, dates, meters):
+            fig_combined.add_trace(go.Bar(
+                x=x,
+                y=y,
+                name=_trace_name(meter_name, label),
+                legendgroup=meter_name,
+                marker=dict(color=color) if meters is None else None,
+                text=[f'{val:,.2f} kWh<br>Date: {date}' for val, date in zip(y, trace_dates)],
+                hoverinfo='text',
+                textposition='none'
+            ))
 
     fig_combined.update_layout(
         title="Peak, Off-Peak, and Total Power Values Over Time",
@@ -182,16 +195,18 @@ def plot_combined_power_values(file_names, power_values, peak_values, off_peak_v
 
     return fig_combined
 
-def plot_peak_power_values(file_names, peak_power_values, dates):
+def plot_peak_power_values(file_names, peak_power_values, dates, meters=None):
     fig_peak_power = go.Figure()
-    fig_peak_power.add_trace(go.Scatter(
-        x=file_names,
-        y=peak_power_values,
-        mode='markers+lines',
-        marker=dict(size=10), 
-       text=[f'{val:,.2f} kW<br>Date: {date}' for val, date in zip(peak_power_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, peak_power_values, dates, meters):
+        fig_peak_power.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} kW<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_peak_power.update_layout(
         title="Peak Power Values Over Time",
@@ -202,16 +217,18 @@ def plot_peak_power_values(file_names, peak_power_values, dates):
 
     return fig_peak_power
 
-def plot_electrical_cost(file_names, e_cost_values, dates):
+def plot_electrical_cost(file_names, e_cost_values, dates, meters=None):
     fig_e_cost = go.Figure()
-    fig_e_cost.add_trace(go.Scatter(
-        x=file_names,
-        y=e_cost_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(e_cost_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, e_cost_values, dates, meters):
+        fig_e_cost.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_e_cost.update_layout(
         title="Electrical Cost Over Time",
@@ -222,16 +239,18 @@ def plot_electrical_cost(file_names, e_cost_values, dates):
 
     return fig_e_cost
 
-def plot_discount_values(file_names, discount_values, dates):
+def plot_discount_values(file_names, discount_values, dates, meters=None):
     fig_discount = go.Figure()
-    fig_discount.add_trace(go.Scatter(
-        x=file_names,
-        y=discount_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(discount_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, discount_values, dates, meters):
+        fig_discount.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_discount.update_layout(
         title="Total Discount Over Time",
@@ -242,16 +261,18 @@ def plot_discount_values(file_names, discount_values, dates):
 
     return fig_discount
 
-def plot_discount_percentage(file_names, discount_values, dates):
+def plot_discount_percentage(file_names, discount_values, dates, meters=None):
     fig_discount = go.Figure()
-    fig_discount.add_trace(go.Scatter(
-        x=file_names,
-        y=discount_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:.0f}%<br>Date: {date}' for val, date in zip(discount_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, discount_values, dates, meters):
+        fig_discount.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:.0f}%<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_discount.update_layout(
         title="Discount Percentage Over Time",
@@ -262,16 +283,18 @@ def plot_discount_percentage(file_names, discount_values, dates):
 
     return fig_discount
 
-def plot_net_electric_cost(file_names, net_e_cost_values, dates):
+def plot_net_electric_cost(file_names, net_e_cost_values, dates, meters=None):
     fig_net_e_cost = go.Figure()
-    fig_net_e_cost.add_trace(go.Scatter(
-        x=file_names,
-        y=net_e_cost_values,
-        mode='markers+lines',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(net_e_cost_values, dates)],
-        hoverinfo='text'
-    ))
+    for meter_name, x, y, trace_dates in _split_by_meter(file_names, net_e_cost_values, dates, meters):
+        fig_net_e_cost.add_trace(go.Scatter(
+            x=x,
+            y=y,
+            name=meter_name,
+            mode='markers+lines',
+            marker=dict(size=10),
+            text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(y, trace_dates)],
+            hoverinfo='text'
+        ))
 
     fig_net_e_cost.update_layout(
         title="Total Net Electric Cost Over Time",
@@ -282,38 +305,27 @@ def plot_net_electric_cost(file_names, net_e_cost_values, dates):
 
     return fig_net_e_cost
 
-def plot_combined_cost(file_names, e_cost_values, discount_values, net_e_cost_values, dates):
+def plot_combined_cost(file_names, e_cost_values, discount_values, net_e_cost_values, dates, meters=None):
     fig_combined_cost = go.Figure()
 
-    fig_combined_cost.add_trace(go.Scatter(
-        x=file_names,
-        y=e_cost_values,
-        mode='markers+lines',
-        name='Electric Cost',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(e_cost_values, dates)],
-        hoverinfo='text'
-    ))
-
-    fig_combined_cost.add_trace(go.Scatter(
-        x=file_names,
-        y=discount_values,
-        mode='markers+lines',
-        name='Discount',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(discount_values, dates)],
-        hoverinfo='text'
-    ))
-
-    fig_combined_cost.add_trace(go.Scatter(
-        x=file_names,
-        y=net_e_cost_values,
-        mode='markers+lines',
-        name='Net Electric Cost',
-        marker=dict(size=10),
-        text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(net_e_cost_values, dates)],
-        hoverinfo='text'
-    ))
+    series = [
+        ('Electric Cost', e_cost_values),
+        ('Discount', discount_values),
+        ('Net Electric Cost', net_e_cost_values),
+    ]
+
+    for label, values in series:
+        for meter_name, x, y, trace_dates in _split_by_meter(file_names, values, dates, meters):
+            fig_combined_cost.add_trace(go.Scatter(
+                x=x,
+                y=y,
+                mode='markers+lines',
+                name=_trace_name(meter_name, label),
+                legendgroup=meter_name,
+                marker=dict(size=10),
+                text=[f'{val:,.2f} (Baht)<br>Date: {date}' for val, date in zip(y, trace_dates)],
+                hoverinfo='text'
+            ))
 
     fig_combined_cost.update_layout(
         title="Electric Cost, Discount, and Net Electric Cost Over Time",
@@ -329,4 +341,161 @@ def create_bar_chart(title, labels, values):
         go.Bar(name=label, x=[label], y=[value]) for label, value in zip(labels, values)
     ])
     fig.update_layout(title=title, barmode='group')
-    return fig
\ No newline at end of file
+    return fig
+
+def plot_rollup(cube_frame, metric, metric_label, granularity):
+    fig_rollup = go.Figure()
+
+    for meter_name in cube_frame.index.get_level_values('meter').unique():
+        if meter_name == 'All Meters':
+            continue
+        meter_frame = cube_frame.loc[meter_name]
+        fig_rollup.add_trace(go.Bar(
+            x=list(meter_frame.index),
+            y=meter_frame[metric],
+            name=meter_name,
+            text=[f'{meter_name}<br>{val:,.2f}<br>{period}' for val, period in zip(meter_frame[metric], meter_frame.index)],
+            hoverinfo='text',
+            textposition='none'
+        ))
+
+    fig_rollup.update_layout(
+        title=f"{metric_label} per {granularity}",
+        xaxis_title=granularity,
+        yaxis_title=metric_label,
+        xaxis=dict(tickangle=-45, type='category'),
+        barmode='group'
+    )
+
+    return fig_rollup
+
+def plot_period_comparison(meter_names, values_a, values_b, period_a, period_b, metric_label):
+    fig_compare = go.Figure()
+
+    fig_compare.add_trace(go.Bar(
+        x=meter_names,
+        y=values_a,
+        name=period_a,
+        text=[f'{val:,.2f}<br>{period_a}' for val in values_a],
+        hoverinfo='text',
+        textposition='none'
+    ))
+
+    fig_compare.add_trace(go.Bar(
+        x=meter_names,
+        y=values_b,
+        name=period_b,
+        text=[f'{val:,.2f}<br>{period_b}' for val in values_b],
+        hoverinfo='text',
+        textposition='none'
+    ))
+
+    fig_compare.update_layout(
+        title=f"{metric_label}: {period_a} vs {period_b}",
+        xaxis_title="Meters",
+        yaxis_title=metric_label,
+        barmode='group'
+    )
+
+    return fig_compare
+
+def plot_scenario_surface(peak_rates, off_peak_rates, net_costs, discount_percent):
+    fig_scenario = go.Figure(data=go.Heatmap(
+        x=off_peak_rates,
+        y=peak_rates,
+        z=net_costs,
+        colorscale='Viridis',
+        colorbar=dict(title='Baht(B)'),
+        hovertemplate='Peak Rate: %{y:,.4f}<br>Off-Peak Rate: %{x:,.4f}<br>Net Cost: %{z:,.2f} Baht<extra></extra>'
+    ))
+
+    fig_scenario.update_layout(
+        title=f"Net Electric Cost at {discount_percent:.0f}% Discount",
+        xaxis_title="Off-Peak Rate (Baht/kWh)",
+        yaxis_title="Peak Rate (Baht/kWh)"
+    )
+
+    return fig_scenario
+
+def plot_discount_sensitivity(discount_percents, meter_names, net_costs):
+    fig_sensitivity = go.Figure()
+
+    for meter_name, meter_costs in zip(meter_names, net_costs):
+        fig_sensitivity.add_trace(go.Scatter(
+            x=discount_percents,
+            y=meter_costs,
+            mode='markers+lines',
+            name=meter_name,
+            text=[f'{val:,.2f} (Baht)<br>Discount: {percent:.0f}%' for val, percent in zip(meter_costs, discount_percents)],
+            hoverinfo='text'
+        ))
+
+    fig_sensitivity.update_layout(
+        title="Net Electric Cost by Discount Percentage",
+        xaxis_title="Discount Percentage (%)",
+        yaxis_title="Baht(B)"
+    )
+
+    return fig_sensitivity
+
+def plot_guarantee_forecast(months, history, future_months, cumulative, lower, upper, minimum_guarantee, meter_name):
+    fig_forecast = go.Figure()
+    history_x = [str(month) for month in months]
+    future_x = [str(month) for month in future_months]
+
+    fig_forecast.add_trace(go.Scatter(
+        x=future_x + future_x[::-1],
+        y=list(upper) + list(lower)[::-1],
+        fill='toself',
+        fillcolor='rgba(26, 118, 255, 0.2)',
+        line=dict(color='rgba(255, 255, 255, 0)'),
+        name='Confidence Band',
+        hoverinfo='skip'
+    ))
+
+    fig_forecast.add_trace(go.Scatter(
+        x=history_x,
+        y=history,
+        mode='markers+lines',
+        name='Accumulated',
+        marker=dict(size=8),
+        text=[f'{val:,.2f} kWh<br>Month: {month}' for val, month in zip(history, history_x)],
+        hoverinfo='text'
+    ))
+
+    fig_forecast.add_trace(go.Scatter(
+        x=future_x,
+        y=cumulative,
+        mode='lines',
+        name='Forecast',
+        line=dict(dash='dash', color='rgba(26, 118, 255, 1)'),
+        text=[f'{val:,.2f} kWh<br>Month: {month}' for val, month in zip(cumulative, future_x)],
+        hoverinfo='text'
+    ))
+
+    fig_forecast.add_hline(y=minimum_guarantee, line_dash='dot', line_color='red', annotation_text='Minimum Guarantee')
+
+    fig_forecast.update_layout(
+        title=f"{meter_name} Minimum Guarantee Forecast",
+        xaxis_title="Month",
+        yaxis_title="Accumulated Power (kWh)",
+        xaxis=dict(tickangle=-45, type='category')
+    )
+
+    return fig_forecast
+
+def add_anomaly_markers(fig, x_values, y_values, reasons):
+    if not x_values:
+        return fig
+
+    fig.add_trace(go.Scatter(
+        x=x_values,
+        y=y_values,
+        mode='markers',
+        name='Anomaly',
+        marker=dict(size=16, symbol='x', color='red'),
+        text=[f'{reason}<br>{val:,.2f}' for val, reason in zip(y_values, reasons)],
+        hoverinfo='text'
+    ))
+
+    return fig
@@ -0,0 +1,123 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+
+# Cell positions of the original bill template, checked first when locating
+# labels. A label found on none of the rows leaves its fields missing.
+DEFAULT_ROWS = {
+    'peak': 32,
+    'off_peak': 33,
+    'peak_power': 36,
+    'electric_cost': 39,
+    'discount': 40,
+}
+
+FIELD_CELLS = {
+    'peak_kwh': ('peak', 'Unnamed: 1'),
+    'peak_baht': ('peak', 'Unnamed: 3'),
+    'off_peak_kwh': ('off_peak', 'Unnamed: 1'),
+    'off_peak_baht': ('off_peak', 'Unnamed: 3'),
+    'peak_power': ('peak_power', 'Unnamed: 1'),
+    'electric_cost': ('electric_cost', 'Unnamed: 3'),
+    'discount': ('discount', 'Unnamed: 3'),
+    'discount_percent': ('discount', 'Unnamed: 1'),
+}
+
+# Checked in this order so that e.g. "Off-Peak" is not taken for "Peak".
+LABEL_PATTERNS = [
+    ('off_peak', re.compile(r"off[\s_-]*peak")),
+    ('peak_power', re.compile(r"peak\s*power|demand|\(kw\)|ความต้องการพลังไฟฟ้า")),
+    ('discount', re.compile(r"discount|ส่วนลด")),
+    ('electric_cost', re.compile(r"electric(?:al)?\s*(?:cost|charge)|ค่าไฟฟ้า")),
+    ('peak', re.compile(r"peak")),
+]
+
+# Templates are matched by checking the cached label rows of each known
+# layout, so a file with a known template is read without scanning the sheet.
+# Sessions and the warm-up thread resolve layouts concurrently.
+MAX_LAYOUTS = 32
+
+_layout_cache = OrderedDict()
+_layout_lock = threading.Lock()
+
+
+def _label(df, row):
+    value = df.iat[row, 0]
+    return value.lower() if isinstance(value, str) else ''
+
+
+def _label_column(df):
+    column = df.iloc[:, 0]
+    return column.where(column.map(lambda value: isinstance(value, str)), '').str.lower()
+
+
+def template_fingerprint(rows, unresolved):
+    joined = "\n".join(f"{key}:{row}" for key, row in sorted(rows.items()) if key not in unresolved)
+    return hashlib.sha1(joined.encode('utf-8')).hexdigest()
+
+
+def _matches(label, key):
+    for pattern_key, pattern in LABEL_PATTERNS:
+        if pattern.search(label):
+            return pattern_key == key
+    return False
+
+
+def _fits(df, layout):
+    # A layout with a missing label cannot rule out that label appearing on
+    # another row of a new sheet, so only fully resolved layouts are reused.
+    if layout['unresolved']:
+        return False
+    return all(row < len(df) and _matches(_label(df, row), key) for key, row in layout['rows'].items())
+
+
+def _locate_rows(df):
+    labels = _label_column(df)
+    assigned = labels.map(lambda label: '')
+    for key, pattern in LABEL_PATTERNS:
+        assigned = assigned.mask((assigned == '') & labels.str.contains(pattern), key)
+
+    rows = {}
+    unresolved = []
+    for key, default_row in DEFAULT_ROWS.items():
+        if default_row < len(assigned) and assigned.iat[default_row] == key:
+            rows[key] = default_row
+            continue
+        found = (assigned == key).to_numpy().nonzero()[0]
+        if len(found):
+            rows[key] = int(found[0])
+        else:
+            rows[key] = None
+            unresolved.append(key)
+    return rows, unresolved
+
+
+def resolve_layout(df):
+    with _layout_lock:
+        for fingerprint, layout in _layout_cache.items():
+            if _fits(df, layout):
+                _layout_cache.move_to_end(fingerprint)
+                return layout
+
+    rows, unresolved = _locate_rows(df)
+    fingerprint = template_fingerprint(rows, unresolved)
+    layout = {
+        'fingerprint': fingerprint,
+        'rows': rows,
+        'cells': {field: (rows[key], column) for field, (key, column) in FIELD_CELLS.items()},
+        'moved': [key for key in DEFAULT_ROWS if key not in unresolved and rows[key] != DEFAULT_ROWS[key]],
+        'unresolved': unresolved,
+    }
+    with _layout_lock:
+        _layout_cache[fingerprint] = layout
+        while len(_layout_cache) > MAX_LAYOUTS:
+            _layout_cache.popitem(last=False)
+    return layout
+
+
+def read_cell(df, layout, field):
+    row, column = layout['cells'][field]
+    if row is None:
+        raise KeyError(f"no '{field}' label found in this sheet")
+    return df.iloc[row][column]
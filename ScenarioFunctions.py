@@ -0,0 +1,49 @@
+import numpy as np
+
+# Limits on the scenario grid; the result holds meters x scenarios floats and
+# a few temporaries of the same size, so MAX_CELLS keeps one request near 100 MB.
+MAX_STEPS = 201
+MAX_CELLS = 4_000_000
+
+
+def scenario_cells(meter_count, *step_counts):
+    cells = meter_count
+    for steps in step_counts:
+        cells *= steps
+    return cells
+
+
+def implied_rates(records_frame):
+    peak_kwh = records_frame['peak'].sum()
+    off_peak_kwh = records_frame['off_peak'].sum()
+    peak_rate = records_frame['peak_baht'].sum() / peak_kwh if peak_kwh else 0.0
+    off_peak_rate = records_frame['off_peak_baht'].sum() / off_peak_kwh if off_peak_kwh else 0.0
+    return peak_rate, off_peak_rate
+
+
+def scenario_net_cost(records_frame, peak_rates, off_peak_rates, discount_percents):
+    # Net cost is linear in every rate, so the meter x month matrices are
+    # reduced over months first and the candidates are broadcast afterwards.
+    meters = sorted(records_frame['meter'].unique())
+    cells = scenario_cells(len(meters), len(peak_rates), len(off_peak_rates), len(discount_percents))
+    if cells > MAX_CELLS:
+        raise ValueError(f"{cells:,} scenario values requested, the limit is {MAX_CELLS:,}")
+    frame = records_frame.assign(
+        other_charges=records_frame['electric_cost'] - records_frame['peak_baht'] - records_frame['off_peak_baht']
+    )
+    sums = frame.groupby('meter')[['peak', 'off_peak', 'other_charges']].sum().reindex(meters)
+
+    peak_kwh = sums['peak'].to_numpy(dtype=float)[:, None, None, None]
+    off_peak_kwh = sums['off_peak'].to_numpy(dtype=float)[:, None, None, None]
+    other_charges = sums['other_charges'].to_numpy(dtype=float)[:, None, None, None]
+
+    peak_rates = np.asarray(peak_rates, dtype=float)[None, :, None, None]
+    off_peak_rates = np.asarray(off_peak_rates, dtype=float)[None, None, :, None]
+    discounts = np.asarray(discount_percents, dtype=float)[None, None, None, :] / 100
+
+    electric_cost = other_charges + peak_kwh * peak_rates + off_peak_kwh * off_peak_rates
+    return meters, electric_cost * (1 - discounts)
+
+
+def candidate_range(low, high, steps):
+    return np.linspace(low, high, min(max(int(steps), 1), MAX_STEPS))
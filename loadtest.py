@@ -0,0 +1,237 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import psutil
+import streamlit
+from openpyxl import Workbook
+from streamlit import config
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1 import local_script_runner
+from streamlit.testing.v1.util import build_mock_config_get_option
+
+APP_FILE = "streamlit_app.py"
+
+VIEWS = [
+    "Total Power Distribution", "Cost", "Discount", "All Meters", "Minimum Guarantee",
+    "Drill-Down", "Scenarios", "Anomalies", "Export",
+]
+
+
+class SyntheticUpload(io.BytesIO):
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+
+
+def make_bill(date, meters, rng):
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    for meter in range(1, meters + 1):
+        sheet = workbook.create_sheet(f"Meter {meter}")
+        sheet["A1"] = f"Billing date {date}"
+        # The app reads the date with usecols="A:B", which raises a ParserError
+        # on a sheet with nothing beyond A1; real bills always have more.
+        sheet["C1"] = "Electricity Bill"
+        peak = rng.uniform(8000, 15000)
+        off_peak = rng.uniform(3000, 7000)
+        electric_cost = peak * 4.18 + off_peak * 2.6 + rng.uniform(200, 400)
+        rows = {
+            34: ("Peak", peak, peak * 4.18),
+            35: ("Off Peak", off_peak, off_peak * 2.6),
+            38: ("Peak Power (kW)", rng.uniform(300, 600), None),
+            41: ("Electric Cost", None, electric_cost),
+            42: ("Discount", 0.1, electric_cost * 0.1),
+        }
+        for row, (label, kwh, baht) in rows.items():
+            sheet.cell(row=row, column=1, value=label)
+            sheet.cell(row=row, column=2, value=kwh)
+            sheet.cell(row=row, column=4, value=baht)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def make_pack(session, files, meters):
+    rng = random.Random(session)
+    pack = []
+    for month in range(files):
+        year, month_index = 2023 + month // 12, month % 12 + 1
+        date = f"{year}-{month_index:02d}-28"
+        pack.append((f"session{session}_bill_{year}{month_index:02d}.xlsx", make_bill(date, meters, rng)))
+    return pack
+
+
+def fake_file_uploader(packs):
+    def file_uploader(label, *args, **kwargs):
+        pack = packs.get(streamlit.session_state.get("load_test_pack"))
+        if pack is None:
+            return None
+        return [SyntheticUpload(name, data) for name, data in pack]
+    return file_uploader
+
+
+def shared_runtime():
+    runtime = mock.MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    return runtime
+
+
+def concurrent_sessions(packs):
+    # AppTest installs a fresh Runtime singleton and patches the config for
+    # every run, then restores both, so overlapping sessions would undo each
+    # other's setup mid-run. Each runner also compiles the script itself, and
+    # concurrent compiles can fail with an AST recursion depth error on
+    # Python 3.11. As under a real server, all sessions share one runtime
+    # and one script cache, and the config stays patched for the whole test.
+    runtime = shared_runtime()
+    script_cache = ScriptCache()
+    stack = contextlib.ExitStack()
+    stack.enter_context(mock.patch.object(streamlit, "file_uploader", fake_file_uploader(packs)))
+    stack.enter_context(mock.patch.object(Runtime, "instance", lambda: runtime))
+    stack.enter_context(mock.patch.object(Runtime, "exists", lambda: True))
+    stack.enter_context(mock.patch.object(local_script_runner, "ScriptCache", lambda: script_cache))
+    stack.enter_context(mock.patch.object(config, "get_option", build_mock_config_get_option({"global.appTest": True})))
+    return stack
+
+
+def find_widget(widgets, label):
+    for widget in widgets:
+        if widget.label == label:
+            return widget
+    raise LookupError(f"no widget labelled {label!r} after the last rerun")
+
+
+def timed_run(app, timeout, latencies):
+    start = time.perf_counter()
+    app.run(timeout=timeout)
+    latencies.append(time.perf_counter() - start)
+    if app.exception:
+        raise RuntimeError(app.exception[0].value)
+
+
+def run_session(session, iterations, timeout, latencies):
+    app = AppTest.from_file(APP_FILE, default_timeout=timeout)
+    app.session_state["load_test_pack"] = session
+    timed_run(app, timeout, latencies)
+
+    for iteration in range(iterations):
+        for option in VIEWS:
+            find_widget(app.selectbox, "Select Attributes").set_value(option)
+            timed_run(app, timeout, latencies)
+            if option == "Minimum Guarantee":
+                set_guarantees(app, iteration, timeout, latencies)
+            if option == "Export":
+                find_widget(app.button, "Prepare Records").click()
+                timed_run(app, timeout, latencies)
+
+
+def set_guarantees(app, iteration, timeout, latencies):
+    find_widget(app.selectbox, "Select Start Month").set_value(iteration % 12 + 1)
+    timed_run(app, timeout, latencies)
+
+    guarantee_inputs = [widget for widget in app.number_input if widget.label.startswith("Enter Minimum Guarantee")]
+    for widget in guarantee_inputs:
+        widget.set_value(100000.0 * (iteration + 1))
+    if guarantee_inputs:
+        timed_run(app, timeout, latencies)
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak_rss = self.process.memory_info().rss
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+def run_level(concurrency, iterations, timeout):
+    latencies = []
+    process = psutil.Process()
+    sampler = ResourceSampler()
+    cpu_before = process.cpu_times()
+    sampler.start()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_session, session, iterations, timeout, latencies) for session in range(concurrency)]
+        errors = [future.exception() for future in futures if future.exception()]
+
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    cpu_after = process.cpu_times()
+    cpu_seconds = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+
+    # Latencies of a level with failed sessions only cover the reruns that ran
+    # before the failure, so no percentiles are reported for it.
+    measured = latencies if latencies and not errors else None
+    return {
+        'concurrency': concurrency,
+        'reruns': len(latencies),
+        'p50': percentile(measured, 0.5) if measured else None,
+        'p90': percentile(measured, 0.9) if measured else None,
+        'p99': percentile(measured, 0.99) if measured else None,
+        'mean': statistics.mean(measured) if measured else None,
+        'cpu': 100 * cpu_seconds / elapsed / psutil.cpu_count(),
+        'peak_mb': sampler.peak_rss / 1024 ** 2,
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure rerun latency, CPU and peak memory of streamlit_app.py under concurrent AppTest sessions.")
+    parser.add_argument("--levels", default="1,2,4,8", help="comma separated numbers of concurrent sessions")
+    parser.add_argument("--files", type=int, default=12, help="bills per synthetic pack")
+    parser.add_argument("--meters", type=int, default=4, help="meter sheets per bill")
+    parser.add_argument("--iterations", type=int, default=2, help="interaction rounds per session")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds allowed per rerun")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    levels = [int(level) for level in args.levels.split(",")]
+    packs = {session: make_pack(session, args.files, args.meters) for session in range(max(levels))}
+
+    print(f"{'sessions':>8} {'reruns':>7} {'p50 s':>8} {'p90 s':>8} {'p99 s':>8} {'mean s':>8} {'cpu %':>7} {'peak MB':>9}")
+    with concurrent_sessions(packs):
+        for concurrency in levels:
+            result = run_level(concurrency, args.iterations, args.timeout)
+            if result['errors']:
+                print(f"{result['concurrency']:>8} {result['reruns']:>7} {'failed, no percentiles':>35} "
+                      f"{result['cpu']:>7.1f} {result['peak_mb']:>9.1f}")
+                for error in result['errors']:
+                    print(f"  error: {error!r}")
+                continue
+            print(f"{result['concurrency']:>8} {result['reruns']:>7} {result['p50']:>8.3f} {result['p90']:>8.3f} "
+                  f"{result['p99']:>8.3f} {result['mean']:>8.3f} {result['cpu']:>7.1f} {result['peak_mb']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
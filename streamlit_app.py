@@ -1,7 +1,9 @@
+import time
+script_start = time.perf_counter()
+
+import io
 import streamlit as st
-import pandas as pd
 from natsort import natsorted
-import re
 import plotly.graph_objects as go
 
 from GraphFunctions import create_fig_pie
@@ -16,6 +18,23 @@ from GraphFunctions import plot_discount_values
 from GraphFunctions import plot_net_electric_cost
 from GraphFunctions import plot_combined_cost
 from GraphFunctions import plot_discount_percentage
+from GraphFunctions import plot_rollup
+from GraphFunctions import plot_period_comparison
+from GraphFunctions import plot_scenario_surface
+from GraphFunctions import plot_discount_sensitivity
+from GraphFunctions import plot_guarantee_forecast
+from GraphFunctions import add_anomaly_markers
+
+from ExportFunctions import EXPORT_FORMATS
+from ExportFunctions import export_table
+from ExportFunctions import export_workbook
+
+from StartupFunctions import record_timing
+from StartupFunctions import startup_timings
+from StartupFunctions import load_static_assets
+from StartupFunctions import start_warm_up
+
+imports_done = time.perf_counter()
 
 st.set_page_config(
     page_title="PTTOR Solar Dashboard",
@@ -23,92 +42,134 @@ st.set_page_config(
     layout="wide"
 )
 
-dark_mode_css = """
-<style>
-body {
-    background-color: #0e1117;
-    color: #c9d1d9;
-}
-header, .css-1d391kg, .css-1v3fvcr {
-    background-color: #161b22;
-}
-</style>
-"""
+@st.cache_resource(show_spinner=False)
+def static_assets():
+    return load_static_assets("ptt logo 2.png")
 
-st.markdown(dark_mode_css, unsafe_allow_html=True)
+@st.cache_resource(show_spinner=False)
+def warm_up_thread():
+    return start_warm_up()
 
-logo_url = "ptt logo 2.png"
+assets = static_assets()
+
+st.markdown(assets['css'], unsafe_allow_html=True)
 
 col1, col2 = st.columns([1, 3])
 
 with col1:
-    st.image(logo_url, width=200)
+    st.image(assets['logo'], width=200)
 
 st.title("Solar Project Dashboard")
 
-class InvalidExcelFormatException(Exception):
-    pass
-
-def load_data(file, sheet_name):
-    data = pd.read_excel(file, sheet_name=sheet_name)
-    required_columns = ['Unnamed: 3']
-    missing_columns = [column for column in required_columns if column not in data.columns]
-    
-    if missing_columns:
-        raise InvalidExcelFormatException(
-            f"The file does not have the required format. Missing columns: {', '.join(missing_columns)}"
-        )
-    
-    return data
+@st.cache_data(show_spinner=False)
+def ingest_file(file_bytes, file_name):
+    sheets = read_bill(io.BytesIO(file_bytes))
+    return (sheets, *extract_meter_records(sheets, file_name))
 
-uploaded_files = st.file_uploader("Choose a file", accept_multiple_files=True)
+@st.cache_data(show_spinner=False)
+def rollup_cube_for(records_frame, contract_start):
+    return build_rollup_cube(records_frame, contract_start)
 
-if uploaded_files:
-    options = ["Pie Charts", "Total Power Distribution", "Cost", "Discount", "Minimum Guarantee", "All Meters"]
-    selected_option = st.selectbox("Select Attributes", options)
+uploaded_files = st.file_uploader("Choose a file", accept_multiple_files=True)
 
-    excel_file = pd.ExcelFile(uploaded_files[0])
-    sheet_names = excel_file.sheet_names
+# Bootstrap cost measured inside the script run, from the first import until
+# the uploader is on screen. Only the first run of the process pays for the
+# cold imports, so that run is kept; later runs show the warm cost.
+time_to_uploader = time.perf_counter() - script_start
+record_timing('First run imports', imports_done - script_start)
+record_timing('First run script start to uploader', time_to_uploader)
 
-    selected_sheet = st.selectbox("Select sheet for all files", sheet_names)
+with st.sidebar.expander("Startup Timing"):
+    for name, seconds in startup_timings().items():
+        st.write(f"**{name}**: {seconds:,.3f} s")
+    st.write(f"**This run imports**: {imports_done - script_start:,.3f} s")
+    st.write(f"**This run script start to uploader**: {time_to_uploader:,.3f} s")
 
-    def extract_date_from_excel(file, sheet_name):
-        df = pd.read_excel(file, sheet_name=sheet_name, header=None, nrows=1, usecols="A:B")
-        cell_content = df.iloc[0, 0]
-        date_match = re.search(r"\d{4}-\d{2}-\d{2}", cell_content)
-        if date_match:
-            date = pd.to_datetime(date_match.group(0))
-            formatted_date = date.strftime('%Y-%m-%d')
-            return formatted_date
-        else:
-            return None
+# Started only once the uploader is on screen, so the warm-up runs while the
+# user picks files instead of competing with the first page for the GIL.
+warm_up_thread()
 
-    file_dates = []
-    date_tracker = {}
+if uploaded_files:
+    # pandas, and numpy and pyarrow with it, is the one stack streamlit does not
+    # already import, so it and the modules built on it load once there is
+    # something to parse. Everything else costs too little to be worth deferring.
+    import pandas as pd
+
+    from DataFunctions import METRICS
+    from DataFunctions import GRANULARITIES
+    from DataFunctions import deduplicate_uploads
+    from DataFunctions import extract_meter_records
+    from DataFunctions import meter_name
+    from DataFunctions import read_bill
+    from DataFunctions import build_rollup_cube
+    from DataFunctions import rollup_value
+    from DataFunctions import rollup_periods
+    from DataFunctions import rollup_meters
+
+    from ScenarioFunctions import implied_rates
+    from ScenarioFunctions import scenario_net_cost
+    from ScenarioFunctions import candidate_range
+    from ScenarioFunctions import scenario_cells
+    from ScenarioFunctions import MAX_STEPS
+    from ScenarioFunctions import MAX_CELLS
+
+    from ForecastFunctions import forecast_attainment
+
+    from AnomalyFunctions import ANOMALY_COLUMNS
+    from AnomalyFunctions import update_anomalies
+
+    uploaded_files, duplicate_uploads = deduplicate_uploads(uploaded_files)
+
+    options = ["Pie Charts", "Total Power Distribution", "Cost", "Discount", "Minimum Guarantee", "All Meters", "Drill-Down", "Scenarios", "Anomalies", "Export"]
+    selected_option = st.selectbox("Select Attributes", options)
 
+    bill_sheets = {}
+    meter_records = []
+    ingest_errors = []
+    ingest_templates = {}
+    # Each workbook is parsed once, with every sheet, and the selected-sheet
+    # views read the same records as the all-meter views. Bills without a date
+    # are kept so the Minimum Guarantee totals cover every upload.
     for file in uploaded_files:
-        try:
-            data = load_data(file, selected_sheet)
-            date = extract_date_from_excel(file, selected_sheet)
-            if date:
-                file_dates.append((file, date))
-                if date in date_tracker:
-                    date_tracker[date].append(file.name)
-                else:
-                    date_tracker[date] = [file.name]
-        except InvalidExcelFormatException as e:
-            st.sidebar.header(file.name)
-            st.sidebar.error(f"{file.name} will be excluded because the format does not match.")
+        sheets, records, errors, templates = ingest_file(file.getvalue(), file.name)
+        bill_sheets[file.name] = sheets
+        meter_records.extend(records)
+        ingest_errors.extend(errors)
+        for fingerprint, template in templates.items():
+            ingest_templates.setdefault(fingerprint, {'files': [], **template})['files'].append(file.name)
+
+    # Each template is announced once per session, at the first upload that uses it
+    reported_templates = st.session_state.setdefault("reported_templates", set())
+    for fingerprint, template in ingest_templates.items():
+        if fingerprint in reported_templates:
             continue
+        reported_templates.add(fingerprint)
+        st.sidebar.info(f"New bill template detected ({fingerprint[:8]}) in {template['files'][0]}")
+        if template['moved']:
+            st.sidebar.write(f"**Relocated rows**: {', '.join(template['moved'])}")
+        if template['unresolved']:
+            st.sidebar.warning(f"Labels not found, values left empty: {', '.join(template['unresolved'])}")
+
+    sheet_names = list(dict.fromkeys(name for sheets in bill_sheets.values() for name in sheets if meter_name(name)))
+    selected_sheet = st.selectbox("Select sheet for all files", sheet_names)
+
+    records_frame = pd.DataFrame(meter_records, columns=['file', 'sheet', 'date', 'meter', 'template', 'peak_power', 'discount_percent'] + METRICS)
+    records_frame = records_frame.sort_values('date', kind='stable', na_position='last', ignore_index=True)
+    dated_records = records_frame.dropna(subset=['date'])
+    sheet_records = dated_records[dated_records['sheet'] == selected_sheet]
+
+    if dated_records.empty:
+        st.warning("No billing date was found in any uploaded file.")
+        st.stop()
 
-    file_dates = natsorted(file_dates, key=lambda x: x[1])
+    date_tracker = sheet_records.groupby('date')['file'].agg(list).to_dict()
 
-    dates = [pd.to_datetime(date) for _, date in file_dates]
-    years = sorted(set(date.year for date in dates))
+    dates = [pd.to_datetime(date) for date in sheet_records['date']]
+    years = sorted(set(pd.to_datetime(dated_records['date']).dt.year))
     months = list(range(1, 13))
 
     # Calculate missing months and display full months with missing ones highlighted in red
-    for year in years:
+    for year in sorted(set(date.year for date in dates)):
         year_dates = [date for date in dates if date.year == year]
         year_months = sorted(set(date.month for date in year_dates))
         missing_months = [month for month in months if month not in year_months]
@@ -133,7 +194,34 @@ end_month = st.selectbox("Select End Month", months, index=11)
 start_date = pd.Timestamp(year=start_year, month=start_month, day=1)
 end_date = pd.Timestamp(year=end_year, month=end_month, day=1) + pd.offsets.MonthEnd(0)
 
-filtered_file_dates = [(file, date) for file, date in file_dates if start_date <= pd.to_datetime(date) <= end_date]
+filtered_records = records_frame[pd.to_datetime(records_frame['date']).between(start_date, end_date)]
+filtered_sheet_records = filtered_records[filtered_records['sheet'] == selected_sheet]
+
+selected_meters = st.multiselect("Compare meters across all files", natsorted(records_frame['meter'].unique()))
+
+with st.sidebar.expander("Contract Settings"):
+    first_bill = pd.to_datetime(dated_records['date']).min() if not dated_records.empty else pd.Timestamp.today()
+    contract_start = st.date_input("Contract Start Date", value=first_bill.replace(day=1).date())
+    contract_years = st.number_input("Contract Length (years)", min_value=1, max_value=50, value=25)
+    contract_end = (pd.Timestamp(contract_start) + pd.DateOffset(years=contract_years) - pd.DateOffset(days=1)).date()
+    st.write(f"**Contract End Date**: {contract_end}")
+
+with st.sidebar.expander("Anomaly Settings"):
+    discount_modes = records_frame['discount_percent'].dropna().mode()
+    default_discount = round(float(discount_modes.iloc[0]), 1) if not discount_modes.empty else 0.0
+    contract_discount = st.number_input("Contract Discount (%)", min_value=0.0, max_value=100.0, value=default_discount, format="%.1f")
+    anomaly_window = st.number_input("Rolling Window (months)", min_value=3, value=6)
+    anomaly_threshold = st.number_input("Robust Z-Score Threshold", min_value=0.5, value=3.5, format="%.1f")
+
+# Flags are kept per session and only the months whose windows changed are
+# scored again, so they are refreshed only in the views that show them.
+if selected_option in ["Total Power Distribution", "Cost", "Discount", "Anomalies"]:
+    anomaly_state = st.session_state.setdefault("anomaly_state", {})
+    anomaly_flags = update_anomalies(anomaly_state, dated_records, contract_discount, anomaly_window, anomaly_threshold)
+else:
+    anomaly_flags = pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+anomaly_lookup = {(row.meter, row.month, row.metric): row.reason for row in anomaly_flags.itertuples()}
 
 # Check for duplicate dates and display warnings after the date selection
 duplicate_dates = {date: files for date, files in date_tracker.items() if len(files) > 1}
@@ -146,150 +234,90 @@ if duplicate_dates:
         for file in files:
             st.write(f"- {file}")
 
-total_peak = 0
-total_off_peak = 0
-total_power = 0
-total_electric_cost = 0
-total_discount = 0
-total_net_electric_cost = 0
-total_peak_baht = 0
-total_off_peak_baht = 0
-
-peak_values = []
-off_peak_values = []
-power_values = []
-peak_power_values = []
-e_cost_values = []
-discount_values = []
-net_e_cost_values = []
-file_names = []
-peak_baht_values = []
-off_peak_baht_values = []
-discount_percentages = []
-
-for i, (file, date) in enumerate(filtered_file_dates):
-
-    try:
-        df = load_data(file, selected_sheet)
-    except InvalidExcelFormatException as e:
-        st.sidebar.header(file.name)
-        st.sidebar.error(str(e))
-        continue
-
-    st.sidebar.title(file.name)
-    with st.sidebar.expander(f"Data Preview: {file.name}"):
-        st.sidebar.dataframe(df)
-
-    st.sidebar.write(f"**Date**: {date}")
-
-    def check_type(value, expected_type):
-        if not isinstance(value, expected_type):
-            raise ValueError(f"Expected {expected_type}, but got {type(value)}")
-
-    def convert_to_number(value):
-        try:
-            return float(value.replace(',', ''))
-        except (ValueError, AttributeError):
-            return value
-
-    try:
-        peak = convert_to_number(df.iloc[32]['Unnamed: 1'])
-        baht_peak = convert_to_number(df.iloc[32]['Unnamed: 3'])
-        check_type(peak, (int, float))
-        check_type(baht_peak, (int, float))
-        st.sidebar.write(f"**Peak**: {peak:,.2f} (kWh) ({baht_peak:,.2f} Baht)")
-        total_peak += peak
-        total_peak_baht += baht_peak
-        peak_values.append(peak)
-        peak_baht_values.append(baht_peak)
-        file_names.append(file.name) 
-    except (KeyError, IndexError, ValueError) as e:
-        st.sidebar.write(f"**Peak**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{str(e)}")
-        continue
-
-    try:
-        off_peak = convert_to_number(df.iloc[33]['Unnamed: 1'])
-        baht_off_peak = convert_to_number(df.iloc[33]['Unnamed: 3'])
-        check_type(off_peak, (int, float))
-        check_type(baht_off_peak, (int, float))
-        st.sidebar.write(f"**Off-Peak**: {off_peak:,.2f} (kWh) ({baht_off_peak:,.2f} Baht)")
-        total_off_peak += off_peak
-        total_off_peak_baht += baht_off_peak
-        off_peak_values.append(off_peak)
-        off_peak_baht_values.append(baht_off_peak)
-    except (KeyError, IndexError, ValueError) as e:
-        st.sidebar.write(f"**Off-Peak**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{file.name} will be excluded because it has missing or invalid type information.")
-        continue
-
-    try:
-        power = peak + off_peak
-        check_type(power, (int, float))
-        st.sidebar.write(f"**Power**: {power:,.2f} (kWh)")
-        total_power += power
-        power_values.append(power)
-    except (KeyError, IndexError, ValueError) as e:
-        st.sidebar.write(f"**Power**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{file.name} will be excluded because it has missing or invalid type information.")
-        continue
-
-    try:
-        peak_power = convert_to_number(df.iloc[36]['Unnamed: 1'])
-        check_type(peak_power, (int, float))
-        st.sidebar.write(f"**Peak Power**: {peak_power:,.2f} (kW)")
-        peak_power_values.append(peak_power)
-    except (KeyError, IndexError, ValueError) as e:
+if duplicate_uploads or duplicate_dates:
+    dedup_rows = [(name, original, "Identical content, excluded") for name, original in duplicate_uploads]
+    for date, files in duplicate_dates.items():
+        dedup_rows.extend((name, files[0], f"Same date {date}, different content") for name in files[1:])
+    with st.expander(f"Upload Deduplication: {len(duplicate_uploads)} identical, {len(dedup_rows) - len(duplicate_uploads)} same date"):
+        st.dataframe(pd.DataFrame(dedup_rows, columns=["File", "Matches", "Status"]), hide_index=True)
+
+for file_name, sheet_name, error in ingest_errors:
+    if sheet_name == selected_sheet:
+        st.sidebar.header(file_name)
+        st.sidebar.error(f"{file_name} will be excluded because it has missing or invalid type information. Error: {error}")
+
+for record in filtered_sheet_records.itertuples():
+    st.sidebar.title(record.file)
+    with st.sidebar.expander(f"Data Preview: {record.file}"):
+        st.dataframe(bill_sheets[record.file][selected_sheet])
+
+    st.sidebar.write(f"**Date**: {record.date}")
+    st.sidebar.write(f"**Peak**: {record.peak:,.2f} (kWh) ({record.peak_baht:,.2f} Baht)")
+    st.sidebar.write(f"**Off-Peak**: {record.off_peak:,.2f} (kWh) ({record.off_peak_baht:,.2f} Baht)")
+    st.sidebar.write(f"**Power**: {record.power:,.2f} (kWh)")
+    if pd.isna(record.peak_power):
         st.sidebar.write(f"**Peak Power**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{file.name} will be excluded because it has missing or invalid type information.")
-        continue
-
-    try:
-        electic_cost = convert_to_number(df.iloc[39]['Unnamed: 3'])
-        check_type(electic_cost, (int, float))
-        st.sidebar.write(f"**Total Electric Cost**: {electic_cost:,.2f} Baht")
-        total_electric_cost += electic_cost
-        e_cost_values.append(electic_cost)
-    except (KeyError, IndexError, ValueError) as e:
-        st.sidebar.write(f"**Total Electric Cost**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{file.name} will be excluded because it has missing or invalid type information.")
-        continue
-
-    try:
-        discount = convert_to_number(df.iloc[40]['Unnamed: 3'])
-        discount_percent = convert_to_number(df.iloc[40]['Unnamed: 1'])
-        check_type(discount, (int, float))
-        check_type(discount_percent, (int, float))
-        discount_percent = discount_percent * 100
-        st.sidebar.write(f"**Discount**: {discount:,.2f} Baht ({discount_percent:,.0f}%)")
-        total_discount += discount
-        discount_values.append(discount)
-        discount_percentages.append(discount_percent)
-    except (KeyError, IndexError, ValueError) as e:
-        st.sidebar.write(f"**Discount**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{file.name} will be excluded because it has missing or invalid type information.")
-        continue
-
-    try:
-        net_electric_cost = electic_cost - discount
-        check_type(net_electric_cost, (int, float))
-        st.sidebar.write(f"**Net Electrical Cost (Baht) (ไม่รวมภาษี 7 %)**: {net_electric_cost:,.2f} Baht")
-        total_net_electric_cost += net_electric_cost
-        net_e_cost_values.append(net_electric_cost)
-    except (KeyError, IndexError, ValueError) as e:
-        st.sidebar.write(f"**Net Electrical Cost (Baht) (ไม่รวมภาษี 7 %)**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-        st.sidebar.error(f"{file.name} will be excluded because it has missing or invalid type information.")
-        continue
-
-    if selected_option == "Pie Charts":
+    else:
+        st.sidebar.write(f"**Peak Power**: {record.peak_power:,.2f} (kW)")
+    st.sidebar.write(f"**Total Electric Cost**: {record.electric_cost:,.2f} Baht")
+    if pd.isna(record.discount_percent):
+        st.sidebar.write(f"**Discount**: {record.discount:,.2f} Baht")
+    else:
+        st.sidebar.write(f"**Discount**: {record.discount:,.2f} Baht ({record.discount_percent:,.0f}%)")
+    st.sidebar.write(f"**Net Electrical Cost (Baht) (ไม่รวมภาษี 7 %)**: {record.net_electric_cost:,.2f} Baht")
+
+total_peak = filtered_sheet_records['peak'].sum()
+total_off_peak = filtered_sheet_records['off_peak'].sum()
+total_power = filtered_sheet_records['power'].sum()
+total_electric_cost = filtered_sheet_records['electric_cost'].sum()
+total_discount = filtered_sheet_records['discount'].sum()
+total_net_electric_cost = filtered_sheet_records['net_electric_cost'].sum()
+total_peak_baht = filtered_sheet_records['peak_baht'].sum()
+total_off_peak_baht = filtered_sheet_records['off_peak_baht'].sum()
+
+if selected_option == "Pie Charts":
+    for i, record in enumerate(filtered_sheet_records.itertuples()):
         if i % 5 == 0:
             cols = st.columns(5)
 
-        fig_pie = create_fig_pie(peak, off_peak, file.name, date)
+        fig_pie = create_fig_pie(record.peak, record.off_peak, record.file, record.date)
         cols[i % 5].plotly_chart(fig_pie)
 
+if ingest_templates:
+    with st.sidebar.expander(f"Bill Templates ({len(ingest_templates)})"):
+        for fingerprint, template in ingest_templates.items():
+            st.write(f"**{fingerprint[:8]}**: {len(template['files'])} file(s)")
+            for name in template['files']:
+                st.write(f"- {name}")
+
+if selected_meters:
+    chart_records = filtered_records[filtered_records['meter'].isin(selected_meters)]
+    chart_meters = list(chart_records['meter'])
+else:
+    chart_records = filtered_sheet_records
+    chart_meters = None
+chart_files = list(chart_records['file'])
+chart_dates = list(chart_records['date'])
+chart_values = {column: list(chart_records[column]) for column in chart_records.columns}
+
+sheet_meter = meter_name(selected_sheet)
+
+def anomaly_points(metric):
+    x_values, y_values, reasons = [], [], []
+    point_meters = chart_meters or [sheet_meter] * len(chart_files)
+    for file_name, value, date, meter_name in zip(chart_files, chart_values[metric], chart_dates, point_meters):
+        reason = anomaly_lookup.get((meter_name, str(pd.Period(date, freq='M')), metric))
+        if reason:
+            x_values.append(file_name)
+            y_values.append(value)
+            reasons.append(f"{meter_name}: {reason}")
+    return x_values, y_values, reasons
+
 if uploaded_files:
 
+    if selected_meters and selected_option in ["Total Power Distribution", "Cost", "Discount"]:
+        st.caption(f"Totals are for sheet {selected_sheet}. Charts show {', '.join(selected_meters)}.")
+
     if selected_option == "Pie Charts":
         st.header("Total Power Distribution")
         fig_pie = plot_power_distribution(total_peak, total_off_peak)
@@ -299,82 +327,66 @@ if uploaded_files:
 
         st.header(f"Total Peak: {total_peak:,.2f} (kWh)")
         st.write(f"Total Peak in Baht: {total_peak_baht:,.2f} Baht")
-        fig_peak = plot_peak_values(file_names, peak_values, [date for _, date in filtered_file_dates])
+        fig_peak = plot_peak_values(chart_files, chart_values['peak'], chart_dates, chart_meters)
         st.plotly_chart(fig_peak)
 
         st.header(f"Total Off-Peak: {total_off_peak:,.2f} (kWh)")
         st.write(f"Total Off-Peak in Baht: {total_off_peak_baht:,.2f} Baht")
-        fig_off_peak = plot_off_peak_values(file_names, off_peak_values, [date for _, date in filtered_file_dates])
+        fig_off_peak = plot_off_peak_values(chart_files, chart_values['off_peak'], chart_dates, chart_meters)
+        add_anomaly_markers(fig_off_peak, *anomaly_points('off_peak'))
         st.plotly_chart(fig_off_peak)
         
         st.header(f"Total Power: {total_power:,.2f} (kWh)")
         st.write(f"Total Power in Baht: {total_off_peak_baht+total_peak_baht:,.2f} Baht")
-        fig_power = plot_power_values(file_names, power_values, [date for _, date in filtered_file_dates])
+        fig_power = plot_power_values(chart_files, chart_values['power'], chart_dates, chart_meters)
         st.plotly_chart(fig_power)
 
         st.header(f"Peak, Off-Peak, Power")
-        fig_combined = plot_combined_power_values(file_names, power_values, peak_values, off_peak_values, [date for _, date in filtered_file_dates])
+        fig_combined = plot_combined_power_values(chart_files, chart_values['power'], chart_values['peak'], chart_values['off_peak'], chart_dates, chart_meters)
         st.plotly_chart(fig_combined)
 
         st.header("Peak Power (kW)")
-        fig_peak_power = plot_peak_power_values(file_names, peak_power_values, [date for _, date in filtered_file_dates])
+        fig_peak_power = plot_peak_power_values(chart_files, chart_values['peak_power'], chart_dates, chart_meters)
         st.plotly_chart(fig_peak_power)
 
     if selected_option == "Cost":
 
         st.header(f"Total Electric Cost: {total_electric_cost:,.2f} (Baht)")
-        fig_e_cost = plot_electrical_cost(file_names, e_cost_values, [date for _, date in filtered_file_dates])
+        fig_e_cost = plot_electrical_cost(chart_files, chart_values['electric_cost'], chart_dates, chart_meters)
         st.plotly_chart(fig_e_cost)
 
         st.header(f"Total Net Electric Cost: {total_net_electric_cost:,.2f} (Baht)")
         st.write("(Electric Cost - Discount)")
-        fig_net_e_cost = plot_net_electric_cost(file_names, net_e_cost_values, [date for _, date in filtered_file_dates])
+        fig_net_e_cost = plot_net_electric_cost(chart_files, chart_values['net_electric_cost'], chart_dates, chart_meters)
+        add_anomaly_markers(fig_net_e_cost, *anomaly_points('net_electric_cost'))
         st.plotly_chart(fig_net_e_cost)
 
         st.header("Electric Cost, Discount, and Net Electric Cost")
-        fig_combined_cost = plot_combined_cost(file_names, e_cost_values, discount_values, net_e_cost_values, [date for _, date in filtered_file_dates])
+        fig_combined_cost = plot_combined_cost(chart_files, chart_values['electric_cost'], chart_values['discount'], chart_values['net_electric_cost'], chart_dates, chart_meters)
         st.plotly_chart(fig_combined_cost)
 
     if selected_option == "Discount":
 
         st.header(f"Total Discount: {total_discount:,.2f} (Baht)")
-        fig_discount = plot_discount_values(file_names, discount_values, [date for _, date in filtered_file_dates])
+        fig_discount = plot_discount_values(chart_files, chart_values['discount'], chart_dates, chart_meters)
         st.plotly_chart(fig_discount)
 
         st.header(f"Discount Percentage")
-        fig_discount_percentage = plot_discount_percentage(file_names, discount_percentages, [date for _, date in filtered_file_dates])
+        fig_discount_percentage = plot_discount_percentage(chart_files, chart_values['discount_percent'], chart_dates, chart_meters)
+        add_anomaly_markers(fig_discount_percentage, *anomaly_points('discount_percent'))
         st.plotly_chart(fig_discount_percentage)
 
 
     if selected_option == "Minimum Guarantee":
         st.title("Minimum Guarantee")
 
-        meter_data = {}
         user_minimum_guarantees = {}
 
-        for file in uploaded_files:
-            excel_file = pd.ExcelFile(file)
-            for sheet_name in excel_file.sheet_names:
-                df = pd.read_excel(file, sheet_name=sheet_name)
-                
-                meter_name_match = re.search(r'Meter\s?\d+', sheet_name)
-                if meter_name_match:
-                    meter_name = meter_name_match.group(0)
-                    
-                    try:
-                        peak = df.iloc[32]['Unnamed: 1']
-                        off_peak = df.iloc[33]['Unnamed: 1']
-                        check_type(peak, (int, float))
-                        check_type(off_peak, (int, float))
-                        power_value = peak + off_peak
-                        
-                        if meter_name not in meter_data:
-                            meter_data[meter_name] = 0
-                        meter_data[meter_name] += power_value
-                    except (KeyError, IndexError, ValueError) as e:
-                        st.write(f"**{sheet_name}**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-                        st.error(f"{file.name} - {sheet_name} will be excluded because it has missing or invalid type information. Error: {str(e)}")
-                        continue
+        for file_name, sheet_name, error in ingest_errors:
+            st.write(f"**{sheet_name}**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
+            st.error(f"{file_name} - {sheet_name} will be excluded because it has missing or invalid type information. Error: {error}")
+
+        meter_data = records_frame.groupby('meter')['power'].sum().to_dict()
 
         total_power_all_meters = sum(meter_data.values())
 
@@ -428,84 +440,58 @@ if uploaded_files:
                 st.progress(progress_all_meters)
             else:
                 st.write("Please enter a valid minimum guarantee for All Meters.")
+
+            forecast_meters = [meter_name for meter_name, guarantee in user_minimum_guarantees.items() if guarantee > 0]
+            if forecast_meters:
+                st.title("Minimum Guarantee Forecast")
+                st.write(f"Forecasting to the contract end date {contract_end} (set in Contract Settings)")
+                undated_files = records_frame.loc[records_frame['date'].isna(), 'file'].unique()
+                if len(undated_files):
+                    st.caption(f"{len(undated_files)} bill(s) without a date count towards the totals above but not towards the monthly trend.")
+
+                forecast_summary, projection = forecast_attainment(records_frame, user_minimum_guarantees, contract_end)
+
+                for row_index, row in forecast_summary.iterrows():
+                    if row['meter'] not in forecast_meters:
+                        continue
+                    st.header(f"{row['meter']} Forecast")
+                    if row['reached']:
+                        st.write(f"Goal has been reached for {row['meter']}!")
+                    elif row['expected_date']:
+                        st.write(f"Expected to reach the Minimum Guarantee in {row['expected_date']} (between {row['earliest_date']} and {row['latest_date'] or 'after contract end'})")
+                    else:
+                        st.write(f"<span style='color:red'>Expected to miss the Minimum Guarantee by {row['shortfall']:,.2f} (kWh) at contract end ({row['shortfall_low']:,.2f} to {row['shortfall_high']:,.2f} kWh)</span>", unsafe_allow_html=True)
+
+                    fig_forecast = plot_guarantee_forecast(
+                        projection['months'],
+                        projection['history'][row_index],
+                        projection['future_months'],
+                        projection['cumulative'][row_index],
+                        projection['lower'][row_index],
+                        projection['upper'][row_index],
+                        row['guarantee'],
+                        row['meter']
+                    )
+                    st.plotly_chart(fig_forecast)
         else:
             st.write("No valid meter data found.")
 
     if selected_option == "All Meters":
-        meter_summaries = {}
-        total_peak = 0
-        total_off_peak = 0
-        total_power = 0
-        total_electric_cost = 0
-        total_discount = 0
-        total_net_electric_cost = 0
-        total_peak_baht = 0
-        total_off_peak_baht = 0
-
-        for file, date in filtered_file_dates:  
-            excel_file = pd.ExcelFile(file)
-            for sheet_name in excel_file.sheet_names:
-                try:
-                    df = pd.read_excel(file, sheet_name=sheet_name)
-                    
-                    meter_name_match = re.search(r'Meter\s?\d+', sheet_name)
-                    if meter_name_match:
-                        meter_name = meter_name_match.group(0)
-                        if meter_name not in meter_summaries:
-                            meter_summaries[meter_name] = {
-                                'peak': 0,
-                                'off_peak': 0,
-                                'power': 0,
-                                'electric_cost': 0,
-                                'discount': 0,
-                                'net_electric_cost': 0,
-                                'peak_baht': 0,
-                                'off_peak_baht': 0
-                            }
-
-                        peak = convert_to_number(df.iloc[32]['Unnamed: 1'])
-                        baht_peak = convert_to_number(df.iloc[32]['Unnamed: 3'])
-                        check_type(peak, (int, float))
-                        check_type(baht_peak, (int, float))
-                        meter_summaries[meter_name]['peak'] += peak
-                        meter_summaries[meter_name]['peak_baht'] += baht_peak
-
-                        off_peak = convert_to_number(df.iloc[33]['Unnamed: 1'])
-                        baht_off_peak = convert_to_number(df.iloc[33]['Unnamed: 3'])
-                        check_type(off_peak, (int, float))
-                        check_type(baht_off_peak, (int, float))
-                        meter_summaries[meter_name]['off_peak'] += off_peak
-                        meter_summaries[meter_name]['off_peak_baht'] += baht_off_peak
-
-                        power = peak + off_peak
-                        check_type(power, (int, float))
-                        meter_summaries[meter_name]['power'] += power
-
-                        electic_cost = convert_to_number(df.iloc[39]['Unnamed: 3'])
-                        check_type(electic_cost, (int, float))
-                        meter_summaries[meter_name]['electric_cost'] += electic_cost
-
-                        discount = convert_to_number(df.iloc[40]['Unnamed: 3'])
-                        check_type(discount, (int, float))
-                        meter_summaries[meter_name]['discount'] += discount
-
-                        net_electric_cost = electic_cost - discount
-                        check_type(net_electric_cost, (int, float))
-                        meter_summaries[meter_name]['net_electric_cost'] += net_electric_cost
-
-                        total_peak += peak
-                        total_peak_baht += baht_peak
-                        total_off_peak += off_peak
-                        total_off_peak_baht += baht_off_peak
-                        total_power += power
-                        total_electric_cost += electic_cost
-                        total_discount += discount
-                        total_net_electric_cost += net_electric_cost
-
-                except (KeyError, IndexError, ValueError) as e:
-                    st.sidebar.write(f"**{sheet_name}**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
-                    st.sidebar.error(f"{file.name} - {sheet_name} will be excluded because it has missing or invalid type information. Error: {str(e)}")
-                    continue
+        filtered_names = set(filtered_records['file'])
+        for file_name, sheet_name, error in ingest_errors:
+            if file_name in filtered_names:
+                st.sidebar.write(f"**{sheet_name}**: <span style='color:red'>Missing or Invalid Type</span>", unsafe_allow_html=True)
+                st.sidebar.error(f"{file_name} - {sheet_name} will be excluded because it has missing or invalid type information. Error: {error}")
+
+        meter_summaries = filtered_records.groupby('meter')[METRICS].sum().to_dict('index')
+        total_peak = filtered_records['peak'].sum()
+        total_off_peak = filtered_records['off_peak'].sum()
+        total_power = filtered_records['power'].sum()
+        total_electric_cost = filtered_records['electric_cost'].sum()
+        total_discount = filtered_records['discount'].sum()
+        total_net_electric_cost = filtered_records['net_electric_cost'].sum()
+        total_peak_baht = filtered_records['peak_baht'].sum()
+        total_off_peak_baht = filtered_records['off_peak_baht'].sum()
 
         st.header("All Meters Summary")
         st.write(f"**Total Peak**: {total_peak:,.2f} kWh ({total_peak_baht:,.2f} Baht)")                            
@@ -544,3 +530,159 @@ if uploaded_files:
 
         st.plotly_chart(fig)
 
+    if selected_option == "Drill-Down":
+        st.title("Drill-Down")
+
+        for file_name, sheet_name, error in ingest_errors:
+            st.sidebar.error(f"{file_name} - {sheet_name} will be excluded because it has missing or invalid type information. Error: {error}")
+
+        rollup_cube = rollup_cube_for(dated_records, contract_start) if not dated_records.empty else {}
+        if rollup_cube:
+            metric_labels = {
+                'Power (kWh)': 'power',
+                'Peak (kWh)': 'peak',
+                'Off-Peak (kWh)': 'off_peak',
+                'Peak (Baht)': 'peak_baht',
+                'Off-Peak (Baht)': 'off_peak_baht',
+                'Electric Cost (Baht)': 'electric_cost',
+                'Discount (Baht)': 'discount',
+                'Net Electric Cost (Baht)': 'net_electric_cost',
+            }
+            granularity = st.radio("Select Period", GRANULARITIES, horizontal=True)
+            metric_label = st.selectbox("Select Metric", list(metric_labels.keys()))
+            metric = metric_labels[metric_label]
+
+            fig_rollup = plot_rollup(rollup_cube[granularity], metric, metric_label, granularity)
+            st.plotly_chart(fig_rollup)
+
+            st.header("Period Comparison")
+            periods = rollup_periods(rollup_cube, granularity)
+            meter_names = rollup_meters(rollup_cube, granularity)
+            col_a, col_b = st.columns(2)
+            period_a = col_a.selectbox("First Period", periods)
+            period_b = col_b.selectbox("Second Period", periods, index=len(periods)-1)
+
+            values_a = [rollup_value(rollup_cube, granularity, meter_name, period_a, metric) for meter_name in meter_names]
+            values_b = [rollup_value(rollup_cube, granularity, meter_name, period_b, metric) for meter_name in meter_names]
+
+            fig_compare = plot_period_comparison(meter_names, values_a, values_b, period_a, period_b, metric_label)
+            st.plotly_chart(fig_compare)
+
+            for meter_name, value_a, value_b in zip(meter_names, values_a, values_b):
+                st.write(f"**{meter_name}**: {value_a:,.2f} → {value_b:,.2f} ({value_b - value_a:+,.2f})")
+        else:
+            st.write("No valid meter data found.")
+
+    if selected_option == "Scenarios":
+        st.title("Tariff and Discount Scenarios")
+
+        if not filtered_records.empty:
+            current_peak_rate, current_off_peak_rate = implied_rates(filtered_records)
+            st.write(f"Current rates: Peak {current_peak_rate:,.4f} Baht/kWh, Off-Peak {current_off_peak_rate:,.4f} Baht/kWh")
+
+            col_peak, col_off_peak, col_discount = st.columns(3)
+            with col_peak:
+                peak_low = st.number_input("Peak Rate From", min_value=0.0, value=current_peak_rate * 0.8, format="%.4f")
+                peak_high = st.number_input("Peak Rate To", min_value=0.0, value=current_peak_rate * 1.2, format="%.4f")
+                peak_steps = st.number_input("Peak Rate Steps", min_value=1, max_value=MAX_STEPS, value=41)
+            with col_off_peak:
+                off_peak_low = st.number_input("Off-Peak Rate From", min_value=0.0, value=current_off_peak_rate * 0.8, format="%.4f")
+                off_peak_high = st.number_input("Off-Peak Rate To", min_value=0.0, value=current_off_peak_rate * 1.2, format="%.4f")
+                off_peak_steps = st.number_input("Off-Peak Rate Steps", min_value=1, max_value=MAX_STEPS, value=41)
+            with col_discount:
+                discount_low = st.number_input("Discount % From", min_value=0.0, max_value=100.0, value=0.0, format="%.1f")
+                discount_high = st.number_input("Discount % To", min_value=0.0, max_value=100.0, value=30.0, format="%.1f")
+                discount_steps = st.number_input("Discount Steps", min_value=1, max_value=MAX_STEPS, value=31)
+
+            peak_rates = candidate_range(peak_low, peak_high, peak_steps)
+            off_peak_rates = candidate_range(off_peak_low, off_peak_high, off_peak_steps)
+            discount_percents = candidate_range(discount_low, discount_high, discount_steps)
+
+            meter_count = filtered_records['meter'].nunique()
+            cells = scenario_cells(meter_count, len(peak_rates), len(off_peak_rates), len(discount_percents))
+            if cells > MAX_CELLS:
+                st.error(f"{cells:,} scenario values across {meter_count} meters exceed the limit of {MAX_CELLS:,}. Reduce the number of steps.")
+            else:
+                scenario_meters, net_costs = scenario_net_cost(filtered_records, peak_rates, off_peak_rates, discount_percents)
+                st.write(f"Evaluated {len(peak_rates) * len(off_peak_rates) * len(discount_percents):,} scenarios across {len(scenario_meters)} meters")
+
+                scenario_meter = st.selectbox("Select Meter", ["All Meters"] + scenario_meters)
+                if scenario_meter == "All Meters":
+                    meter_costs = net_costs.sum(axis=0)
+                else:
+                    meter_costs = net_costs[scenario_meters.index(scenario_meter)]
+
+                discount_index = st.select_slider(
+                    "Discount Percentage",
+                    options=list(range(len(discount_percents))),
+                    format_func=lambda index: f"{discount_percents[index]:.1f}%"
+                )
+                fig_scenario = plot_scenario_surface(peak_rates, off_peak_rates, meter_costs[:, :, discount_index], discount_percents[discount_index])
+                st.plotly_chart(fig_scenario)
+
+                peak_index = abs(peak_rates - current_peak_rate).argmin()
+                off_peak_index = abs(off_peak_rates - current_off_peak_rate).argmin()
+                st.header("Discount Sensitivity at Current Rates")
+                fig_sensitivity = plot_discount_sensitivity(discount_percents, scenario_meters, net_costs[:, peak_index, off_peak_index, :])
+                st.plotly_chart(fig_sensitivity)
+
+            st.write(f"Actual Net Electric Cost: {filtered_records['net_electric_cost'].sum():,.2f} Baht")
+        else:
+            st.write("No valid meter data found.")
+
+    if selected_option == "Anomalies":
+        st.title("Anomalies")
+
+        if not anomaly_flags.empty:
+            st.header("Summary")
+            anomaly_counts = anomaly_flags.pivot_table(index='meter', columns='reason', values='month', aggfunc='count', fill_value=0)
+            st.dataframe(anomaly_counts)
+
+            st.header("Flagged Months")
+            st.dataframe(anomaly_flags.sort_values(['month', 'meter']), hide_index=True)
+        else:
+            st.write("No anomalies found.")
+
+    if selected_option == "Export":
+        st.title("Export")
+
+        export_records = filtered_records[['file', 'date', 'meter', 'peak_power', 'discount_percent'] + METRICS]
+        export_summary = filtered_records.groupby('meter')[METRICS].sum().reset_index()
+        export_totals = export_summary[METRICS].sum().to_frame().T
+        export_totals.insert(0, 'end', end_date.strftime('%Y-%m-%d'))
+        export_totals.insert(0, 'start', start_date.strftime('%Y-%m-%d'))
+
+        export_format = st.radio("Select Format", list(EXPORT_FORMATS.keys()), horizontal=True)
+        extension, mime = EXPORT_FORMATS[export_format]
+        range_label = f"{start_date.strftime('%Y%m')}-{end_date.strftime('%Y%m')}"
+
+        # Files are only written once the user asks for them; the request is
+        # remembered for the session so the download button survives the rerun
+        # that clicking it triggers.
+        prepared_exports = st.session_state.setdefault("prepared_exports", set())
+
+        if export_format == "Excel":
+            export_key = (export_format, 'Workbook', range_label)
+            if st.button("Prepare Workbook"):
+                prepared_exports.add(export_key)
+            if export_key in prepared_exports:
+                with export_workbook({'Records': export_records, 'Meter Summary': export_summary, 'Totals': export_totals}) as export_file:
+                    st.download_button(
+                        "Download Workbook",
+                        data=export_file,
+                        file_name=f"solar_dashboard_{range_label}.{extension}",
+                        mime=mime
+                    )
+        else:
+            for label, frame in [('Records', export_records), ('Meter Summary', export_summary), ('Totals', export_totals)]:
+                export_key = (export_format, label, range_label)
+                if st.button(f"Prepare {label}", key=f"prepare_{label}"):
+                    prepared_exports.add(export_key)
+                if export_key in prepared_exports:
+                    with export_table(frame, export_format) as export_file:
+                        st.download_button(
+                            f"Download {label}",
+                            data=export_file,
+                            file_name=f"solar_dashboard_{label.lower().replace(' ', '_')}_{range_label}.{extension}",
+                            mime=mime
+                        )
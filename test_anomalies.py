@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+import AnomalyFunctions
+from AnomalyFunctions import ANOMALY_COLUMNS
+from AnomalyFunctions import SEASON
+from AnomalyFunctions import detect_anomalies
+from AnomalyFunctions import update_anomalies
+
+KEY = ['meter', 'month', 'metric']
+
+
+def records(months=48, drop=(('Meter 2', 40),), discount=10.0):
+    rng = np.random.default_rng(1)
+    rows = []
+    for step in range(months):
+        month = pd.Period('2020-01', freq='M') + step
+        for meter in ['Meter 1', 'Meter 2', 'Meter 3']:
+            value = 10000 * (1 + 0.4 * np.sin(2 * np.pi * step / 12)) * rng.uniform(0.97, 1.03)
+            if (meter, step) in drop:
+                value *= 0.4
+            rows.append({
+                'date': f"{month}-15",
+                'meter': meter,
+                'off_peak': value,
+                'net_electric_cost': value * 3 * rng.uniform(0.97, 1.03),
+                'discount_percent': discount,
+            })
+    return pd.DataFrame(rows)
+
+
+def ordered(flags):
+    return flags.sort_values(KEY).reset_index(drop=True)
+
+
+def test_sudden_drop_is_flagged():
+    flags = detect_anomalies(records(), 10.0)
+    drops = flags[flags['metric'] == 'off_peak']
+    assert drops[KEY].values.tolist() == [['Meter 2', '2023-05', 'off_peak']]
+
+
+def test_no_parseable_discount_gives_empty_flags():
+    frame = records(months=6, drop=(), discount=np.nan)
+    assert detect_anomalies(frame, 10.0).empty
+    assert list(detect_anomalies(frame.iloc[:0], 10.0).columns) == ANOMALY_COLUMNS
+
+
+def test_incremental_matches_full_recompute():
+    frame = records()
+    months = sorted(frame['date'].unique())
+    state = {}
+    for count in range(1, len(months) + 1):
+        flags = update_anomalies(state, frame[frame['date'].isin(months[:count])], 10.0)
+    pd.testing.assert_frame_equal(ordered(flags), ordered(detect_anomalies(frame, 10.0)))
+
+
+def test_new_month_only_rescores_its_windows(monkeypatch):
+    frame = records()
+    months = sorted(frame['date'].unique())
+    state = {}
+    update_anomalies(state, frame[frame['date'].isin(months[:-1])], 10.0, window=6)
+
+    scored = []
+    score = AnomalyFunctions.seasonal_zscores
+    monkeypatch.setattr(AnomalyFunctions, 'seasonal_zscores', lambda values, window: scored.append(len(values)) or score(values, window))
+    update_anomalies(state, frame, 10.0, window=6)
+    # One month per meter and metric, read with its seasonal and trailing window.
+    assert scored == [6 + SEASON + 1] * 6
+
+
+def test_changed_settings_rescore_everything():
+    frame = records()
+    state = {}
+    update_anomalies(state, frame, 10.0, threshold=3.5)
+    flags = update_anomalies(state, frame, 10.0, threshold=50)
+    pd.testing.assert_frame_equal(ordered(flags), ordered(detect_anomalies(frame, 10.0, threshold=50)))
@@ -0,0 +1,76 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from DataFunctions import METRICS
+from ExportFunctions import CHUNK_ROWS
+from ExportFunctions import export_table
+from ExportFunctions import export_workbook
+
+
+def records(rows=3):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        'file': [f"bill_{i}.xlsx" for i in range(rows)],
+        'date': [f"2024-{i % 12 + 1:02d}-01" for i in range(rows)],
+        'meter': [f"Meter {i % 3 + 1}" for i in range(rows)],
+        'peak_power': rng.uniform(300, 600, rows),
+        'discount_percent': np.full(rows, 10.0),
+    })
+    for metric in METRICS:
+        frame[metric] = rng.uniform(1000, 50000, rows)
+    frame.loc[0, 'peak_power'] = np.nan
+    return frame
+
+
+def test_export_is_an_open_rewound_file():
+    with export_table(records(), 'CSV') as exported:
+        assert isinstance(exported, io.BufferedReader)
+        assert exported.tell() == 0
+    assert exported.closed
+
+
+def test_csv_round_trip():
+    frame = records()
+    with export_table(frame, 'CSV') as exported:
+        result = pd.read_csv(exported)
+    pd.testing.assert_frame_equal(result, frame)
+
+
+def test_parquet_round_trip():
+    frame = records()
+    with export_table(frame, 'Parquet') as exported:
+        result = pd.read_parquet(exported)
+    pd.testing.assert_frame_equal(result, frame)
+
+
+def test_parquet_keeps_string_columns_empty_in_first_chunk():
+    frame = records(CHUNK_ROWS + 10)
+    frame['date'] = frame['date'].astype(object)
+    frame.loc[:CHUNK_ROWS - 1, 'date'] = None
+    with export_table(frame, 'Parquet') as exported:
+        result = pd.read_parquet(exported)
+    pd.testing.assert_frame_equal(result, frame)
+
+
+@pytest.mark.parametrize('export', [
+    lambda frame: export_table(frame, 'Excel'),
+    lambda frame: export_workbook({'Data': frame}),
+])
+def test_excel_round_trip(export):
+    frame = records()
+    with export(frame) as exported:
+        result = pd.read_excel(exported, sheet_name='Data')
+    # Excel has one number type, so whole floats such as 10.0 read back as int.
+    pd.testing.assert_frame_equal(result, frame, check_dtype=False)
+
+
+def test_workbook_has_every_sheet():
+    frame = records()
+    tables = {'Records': frame, 'Totals': frame[METRICS].sum().to_frame().T}
+    with export_workbook(tables) as exported:
+        result = pd.read_excel(exported, sheet_name=None)
+    assert list(result) == ['Records', 'Totals']
+    pd.testing.assert_frame_equal(result['Totals'], tables['Totals'], check_dtype=False)
@@ -0,0 +1,116 @@
+import threading
+
+import pandas as pd
+import pytest
+
+import LayoutFunctions
+from DataFunctions import extract_sheet_record
+from LayoutFunctions import DEFAULT_ROWS
+from LayoutFunctions import read_cell
+from LayoutFunctions import resolve_layout
+
+COLUMNS = ['Billing date 2024-01-28', 'Unnamed: 1', 'Unnamed: 2', 'Unnamed: 3']
+
+BILL_ROWS = [
+    ('Peak', 12000.0, 50160.0),
+    ('Off Peak', 5000.0, 13000.0),
+    (None, None, None),
+    (None, None, None),
+    ('Peak Power (kW)', 450.0, None),
+    (None, None, None),
+    (None, None, None),
+    ('Electric Cost', None, 63460.0),
+    ('Discount', 0.1, 90.0),
+]
+
+
+def sheet(rows=BILL_ROWS, start=DEFAULT_ROWS['peak']):
+    frame = pd.DataFrame(None, index=range(start + len(rows) + 5), columns=COLUMNS, dtype=object)
+    for offset, (label, kwh, baht) in enumerate(rows):
+        frame.iloc[start + offset, [0, 1, 3]] = [label, kwh, baht]
+    return frame
+
+
+def relabel(rows, old, new):
+    return [(new if label == old else label, kwh, baht) for label, kwh, baht in rows]
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    LayoutFunctions._layout_cache.clear()
+    yield
+    LayoutFunctions._layout_cache.clear()
+
+
+def test_default_template():
+    layout = resolve_layout(sheet())
+    assert layout['rows'] == DEFAULT_ROWS
+    assert layout['moved'] == []
+    assert layout['unresolved'] == []
+    assert extract_sheet_record(sheet(), layout)['discount'] == 90.0
+
+
+def test_shifted_rows():
+    df = sheet(start=DEFAULT_ROWS['peak'] + 2)
+    layout = resolve_layout(df)
+    assert layout['rows'] == {key: row + 2 for key, row in DEFAULT_ROWS.items()}
+    assert layout['moved'] == list(DEFAULT_ROWS)
+    record = extract_sheet_record(df, layout)
+    assert (record['peak'], record['off_peak'], record['discount']) == (12000.0, 5000.0, 90.0)
+
+
+def test_renamed_label_is_missing_not_read_from_default_row():
+    df = sheet(relabel(BILL_ROWS, 'Discount', 'Rebate'))
+    layout = resolve_layout(df)
+    assert layout['unresolved'] == ['discount']
+    with pytest.raises(KeyError):
+        read_cell(df, layout, 'discount')
+    with pytest.raises(KeyError):
+        extract_sheet_record(df, layout)
+
+
+def test_unresolved_layout_is_not_reused_for_a_shifted_label():
+    resolve_layout(sheet(relabel(BILL_ROWS, 'Discount', 'Rebate')))
+
+    rows = BILL_ROWS[:-1] + [('Service fee', None, 55.0), BILL_ROWS[-1]]
+    df = sheet(rows)
+    layout = resolve_layout(df)
+    assert layout['unresolved'] == []
+    assert extract_sheet_record(df, layout)['discount'] == 90.0
+
+
+def test_optional_field_missing_reads_as_nan():
+    df = sheet(relabel(BILL_ROWS, 'Peak Power (kW)', 'Meter note'))
+    record = extract_sheet_record(df, resolve_layout(df))
+    assert pd.isna(record['peak_power'])
+    assert record['discount'] == 90.0
+
+
+def test_known_template_is_served_from_cache(monkeypatch):
+    first = resolve_layout(sheet())
+
+    def fail(df):
+        raise AssertionError("a cached template should not be located again")
+
+    monkeypatch.setattr(LayoutFunctions, '_locate_rows', fail)
+    assert resolve_layout(sheet()) is first
+
+
+def test_cache_is_bounded_and_safe_across_threads():
+    errors = []
+
+    def resolve(shift):
+        try:
+            for _ in range(20):
+                layout = resolve_layout(sheet(start=DEFAULT_ROWS['peak'] + shift))
+                assert layout['rows']['peak'] == DEFAULT_ROWS['peak'] + shift
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=resolve, args=(shift,)) for shift in range(LayoutFunctions.MAX_LAYOUTS + 8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(LayoutFunctions._layout_cache) <= LayoutFunctions.MAX_LAYOUTS